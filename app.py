@@ -1,56 +1,174 @@
 
-from flask import Flask, render_template, request, redirect, session, send_file
-import sqlite3, os, random
-import pandas as pd
-from datetime import datetime, timedelta
-from io import BytesIO
-from twilio.rest import Client
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
+from flask import Flask, render_template, request, redirect, session, send_file, jsonify, Response, stream_with_context
+import os, time, atexit, tempfile
+from db_pool import ConnectionPool
+from migrations import migrate
+from ingest import iter_chunks, import_students, import_questions
+from sms import SmsDispatcher, make_transport, publish_results, publish_report
+from scheduler import ExamScheduler, DeadlineCache
+from submissions import SubmissionQueue
+from events import ExamEvents, stream
+from grading import (answer_key, build_answer_key, invalidate_answer_key, grade, regrade_exam,
+                     encode_changes, score_answers, OPTIONS)
+from checkpoints import AnswerLog
+from pagination import paginate, CountCache, MAX_MERGE_ARMS
+from exports import iter_rows, stream_csv, write_xlsx, XLSX_MIMETYPE
+from papers import (PaperCache, build_archive, closed_exams, register_functions,
+                    snapshot_paper, delete_paper, list_papers)
+from payloads import PayloadCache
+from shuffling import shuffle_for
+from perf import Profiler
+from sessions import load_secret_key, SessionStore, SqliteSessionInterface
+from credentials import Hasher, Busy
+import queries
+import stats
 
 # =========================
 # APP CONFIG
 # =========================
 app = Flask(__name__)
-app.secret_key = "your_secret_key"
+
+# SECRET_KEY, else a random key kept in SECRET_KEY_FILE (see sessions.py)
+app.secret_key = load_secret_key(os.getenv("SECRET_KEY_FILE", "instance/secret_key"))
 
 
 DB = "database.db"   # ✅ FIX 1: DB defined ONCE
 
+# Seconds after the exam deadline during which submissions are still
+# accepted (flagged late); the exam auto-closes when it runs out.
+app.config["SUBMIT_GRACE_SECONDS"] = int(os.getenv("SUBMIT_GRACE_SECONDS", "60"))
+
+# Larger result exports are streamed as CSV instead of built as .xlsx
+app.config["EXPORT_XLSX_MAX_ROWS"] = int(os.getenv("EXPORT_XLSX_MAX_ROWS", "200000"))
+
+# Worker processes for batch paper rendering (0 → one per CPU)
+app.config["PAPER_WORKERS"] = int(os.getenv("PAPER_WORKERS", "0")) or None
+
+# Seconds between answer autosaves from the exam page (see checkpoints.py)
+app.config["CHECKPOINT_SECONDS"] = int(os.getenv("CHECKPOINT_SECONDS", "15"))
+
+# Per-student question / option order, seeded by HMAC(SHUFFLE_KEY, exam:roll)
+app.config["SHUFFLE_QUESTIONS"] = os.getenv("SHUFFLE_QUESTIONS", "1") == "1"
+app.config["SHUFFLE_OPTIONS"] = os.getenv("SHUFFLE_OPTIONS", "1") == "1"
+app.config["SHUFFLE_KEY"] = os.getenv("SHUFFLE_KEY") or app.secret_key
+
 os.makedirs("uploads", exist_ok=True)
 
 # =========================
-# DATABASE CONNECTION (SINGLE, SAFE VERSION)
+# DATABASE CONNECTION (POOLED)
 # =========================
-def db():
-    con = sqlite3.connect(
-        DB,
-        timeout=30,
-        check_same_thread=False
-    )
-    con.row_factory = sqlite3.Row
-    con.execute("PRAGMA journal_mode=WAL;")
-    con.execute("PRAGMA synchronous=NORMAL;")
-    return con
+# Connections are opened once per pool slot (pragmas applied once),
+# health-checked on checkout and returned on app-context teardown.
+pool = ConnectionPool(
+    DB,
+    max_size=int(os.getenv("DB_POOL_SIZE", "32")),
+    on_open=[register_functions]
+)
+pool.init_app(app)
+
+# =========================
+# SESSIONS (SESSION_BACKEND=sqlite | cookie)
+# =========================
+# sqlite → only a random id in the cookie, data in the sessions table
+# behind a per-process LRU; cookie → Flask's signed cookie sessions.
+session_store = SessionStore(
+    pool,
+    ttl=int(os.getenv("SESSION_TTL", str(8 * 3600))),
+    cache_size=int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+)
 
+if os.getenv("SESSION_BACKEND", "sqlite") == "sqlite":
+    app.session_interface = SqliteSessionInterface(session_store)
 
 # =========================
-# TWILIO CONFIG
+# PASSWORDS (see credentials.py)
 # =========================
-import os
-from twilio.rest import Client
+# PASSWORD_KDF=scrypt|pbkdf2_sha256 with PASSWORD_COST; hashing runs on
+# HASH_WORKERS threads so a login storm cannot take every core.
+hasher = Hasher(
+    kdf=os.getenv("PASSWORD_KDF", "scrypt"),
+    cost=int(os.getenv("PASSWORD_COST", "0")) or None,
+    workers=int(os.getenv("HASH_WORKERS", "0")) or None
+)
+
+def verify_login(con, table, key_column, key, stored, password):
+    ok, rehashed = hasher.verify(stored, password)
+    if ok and rehashed:
+        # Plaintext or older-cost row → upgraded on this login
+        con.execute(
+            f"UPDATE {table} SET password=? WHERE {key_column}=? AND password=?",
+            (rehashed, key, stored)
+        )
+        con.commit()
+    return ok
+
+@app.errorhandler(Busy)
+def login_busy(e):
+    return "⏳ Too many sign-ins right now, please try again in a moment", 503
 
-TWILIO_SID = os.getenv("TWILIO_SID")
-TWILIO_TOKEN = os.getenv("TWILIO_TOKEN")
-TWILIO_FROM = os.getenv("TWILIO_FROM")
+# =========================
+# PROFILING (toggle with PERF_ENABLED or from /admin/perf)
+# =========================
+# Route timings + SQL timings through db(); PERF_PROFILE_SAMPLE of the
+# requests also run under cProfile, kept when slower than PERF_SLOW_MS.
+profiler = Profiler(
+    enabled=os.getenv("PERF_ENABLED", "0") == "1",
+    slow_ms=float(os.getenv("PERF_SLOW_MS", "500")),
+    profile_sample=float(os.getenv("PERF_PROFILE_SAMPLE", "0"))
+)
+profiler.init_app(app)
 
-twilio = Client(TWILIO_SID, TWILIO_TOKEN)
+def db():
+    return profiler.wrap(pool.connection())
+
+
+# =========================
+# PAGED LISTINGS
+# =========================
+# Listings render one keyset page (see pagination.py). Totals under a
+# listing come from exam_stats where possible and are cached per filter.
+listing_counts = CountCache(ttl=int(os.getenv("LISTING_COUNT_TTL", "30")))
+
+def render_listing(template, rows_template, page, **context):
+    # ?partial=1 → only this page's rows; the next page link is a header
+    if request.args.get("partial"):
+        resp = Response(render_template(rows_template, page=page, **context))
+        if page.next_url:
+            resp.headers["X-Next-Page"] = page.next_url
+        return resp
+    return render_template(template, page=page, **context)
+
+def exam_stats_total(column, where, params):
+    def load():
+        con = db()
+        total = con.execute(
+            queries.EXAM_STATS_TOTAL.format(column=column, where=where), params
+        ).fetchone()[0]
+        con.close()
+        return total
+    return listing_counts.get((column, where, tuple(params)), load)
+
+def counted_total(sql, params):
+    def load():
+        con = db()
+        total = con.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+        con.close()
+        return total
+    return listing_counts.get((sql, tuple(params)), load)
+
+def results_page(con, query, params, arm, arm_params, exams, total):
+    # Few enough exams → one (exam_id, submit_time, roll) index walk per
+    # exam, merged in order; otherwise the whole filter sorted per page
+    if exams is not None and len(exams) <= MAX_MERGE_ARMS:
+        query, params = arm, arm_params
+        merge = [tuple(r) for r in exams]
+    else:
+        merge = None
+    return paginate(
+        con, query, params, queries.RESULT_KEYS,
+        request.args, request.path, descending=True, total=total, merge=merge
+    )
 
-def send_sms(to, msg):
-    try:
-        twilio.messages.create(to=to, from_=TWILIO_FROM, body=msg)
-    except:
-        pass
 
 # =========================
 # INIT DATABASE
@@ -59,70 +177,8 @@ def init_db():
     con = db()
     cur = con.cursor()
 
-    cur.execute("""CREATE TABLE IF NOT EXISTS admin(
-        username TEXT PRIMARY KEY,
-        password TEXT
-    )""")
-
-    cur.execute("""CREATE TABLE IF NOT EXISTS faculty(
-        emp_id TEXT PRIMARY KEY,
-        name TEXT,
-        password TEXT
-    )""")
-
-    cur.execute("""CREATE TABLE IF NOT EXISTS students(
-        roll TEXT PRIMARY KEY,
-        name TEXT,
-        parent TEXT,
-        year TEXT,
-        branch TEXT,
-        section TEXT,
-        password TEXT DEFAULT '1234'
-    )""")
-
-    cur.execute("""CREATE TABLE IF NOT EXISTS exams(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        emp_id TEXT,
-        year TEXT,
-        branch TEXT,
-        section TEXT,
-        duration INTEGER,
-        status TEXT,
-        start_time TEXT,
-        exam_date TEXT
-    )""")
-
-    cur.execute("""CREATE TABLE IF NOT EXISTS questions(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        exam_id INTEGER,
-        question TEXT,
-        a TEXT,b TEXT,c TEXT,d TEXT,
-        correct TEXT
-    )""")
-
-    cur.execute("""CREATE TABLE IF NOT EXISTS results(
-        roll TEXT,
-        exam_id INTEGER,
-        marks INTEGER,
-        submit_time TEXT,
-        PRIMARY KEY(roll,exam_id)
-    )""")
-
-    cur.execute("""CREATE TABLE IF NOT EXISTS attendance(
-        exam_id INTEGER,
-        roll TEXT,
-        status TEXT,
-        PRIMARY KEY(exam_id,roll)
-    )""")
-
-    cur.execute("""CREATE TABLE IF NOT EXISTS exam_papers(
-        exam_id INTEGER,
-        year TEXT,
-        branch TEXT,
-        section TEXT,
-        exam_date TEXT,
-        question TEXT,a TEXT,b TEXT,c TEXT,d TEXT,correct TEXT
-    )""")
+    # Tables + indexes are versioned in migrations.py
+    migrate(con)
 
     cur.execute("""
         INSERT OR IGNORE INTO admin(username,password)
@@ -134,21 +190,166 @@ def init_db():
 
 init_db()
 
+# Paper render workers (papers.build_archive) start from a fresh
+# interpreter, which re-imports this file as __mp_main__ when the app runs
+# as `python app.py`; background threads belong to the app process only.
+BACKGROUND = __name__ != "__mp_main__"
+
+# =========================
+# SMS OUTBOX DISPATCHER
+# =========================
+# Twilio (TWILIO_SID/TOKEN/FROM), or the offline stub only with
+# SMS_TRANSPORT=stub; without either, messages fail instead of faking SENT.
+# Requests only queue messages; this thread sends, retries and records them
+# at no more than SMS_RATE messages per second (provider limit).
+sms_dispatcher = SmsDispatcher(
+    pool,
+    make_transport(),
+    workers=int(os.getenv("SMS_WORKERS", "8")),
+    rate=float(os.getenv("SMS_RATE", "10"))
+)
+
+if BACKGROUND and os.getenv("SMS_DISPATCHER", "1") == "1":
+    sms_dispatcher.start()
+
+# =========================
+# SUBMISSION QUEUE (WRITE-BEHIND)
+# =========================
+# Exam submissions are fsync'd to submission_log/ and acknowledged at
+# once; results/responses/attendance rows are group-committed every few
+# milliseconds. SUBMIT_QUEUE=0 writes each submission through instead.
+submission_queue = SubmissionQueue(pool)
+
+# Live monitor feed: committed submissions → faculty SSE streams
+exam_events = ExamEvents()
+
+
+# exam_stats moves in the same transaction as the results it counts
+submission_queue.add_hook(stats.submissions_added, in_transaction=True)
+
+
+@submission_queue.add_hook
+def announce_submissions(con, records):
+    for r in records:
+        exam_events.submitted(r["exam_id"], r["roll"], r["marks"])
+
+
+if BACKGROUND and os.getenv("SUBMIT_QUEUE", "1") == "1":
+    submission_queue.start()
+    atexit.register(submission_queue.stop)
+
 # =========================
 # AUTO CLOSE EXAMS
 # =========================
-def auto_close_exams():
-    con = db()
-    cur = con.cursor()
-    now = datetime.now()
+# Deadlines are pushed when start_exam runs and rebuilt from the database
+# here at startup; the scheduler closes due exams and runs the hooks below.
+exam_deadlines = DeadlineCache()
+exam_scheduler = ExamScheduler(
+    pool,
+    grace=app.config["SUBMIT_GRACE_SECONDS"],
+    deadlines=exam_deadlines
+)
+
+
+# Autosaved answers of running exams (one append-only log per exam)
+answer_log = AnswerLog(os.getenv("ANSWER_LOG_DIR", "answer_log"))
+
+
+@exam_scheduler.add_hook
+def submit_checkpoints(con, exam_ids):
+    # Students who never pressed submit are graded from their last
+    # checkpoint; those already submitted are skipped by the queue
+    for exam_id in exam_ids:
+        saved = answer_log.students(exam_id)
+        if saved:
+            key = answer_key(con, exam_id)
+            n = len(key)
+            deadline = exam_deadlines.get(con, exam_id)
+            for roll, answers, saved_at in saved:
+                answers = (answers + bytes(n))[:n]
+                submission_queue.submit({
+                    "exam_id": exam_id,
+                    "roll": roll,
+                    "marks": score_answers(key, answers),
+                    "answers": answers.hex(),
+                    "late": int(deadline is not None and saved_at > deadline),
+                    "submit_time": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(saved_at)),
+                    "attended_on": time.strftime("%Y-%m-%d", time.gmtime(saved_at)),
+                })
+        submission_queue.flush()
+        answer_log.drop(exam_id)
+
+
+@exam_scheduler.add_hook
+def drain_submissions(con, exam_ids):
+    # Late submissions still in the queue must land before publishing
+    submission_queue.flush()
+
+
+# Question paper PDFs are rendered once, when the exam closes, and then
+# served from disk (see papers.PaperCache)
+paper_cache = PaperCache(os.getenv("PAPER_CACHE_DIR", "paper_cache"))
+
+# Question set of each running exam, rendered once at start_exam and
+# shared by every student's exam page (see payloads.PayloadCache)
+exam_payloads = PayloadCache()
+
+
+def student_shuffle(exam_id, roll, n):
+    # Same student → same order on every request; None when turned off
+    questions = app.config["SHUFFLE_QUESTIONS"]
+    options = app.config["SHUFFLE_OPTIONS"]
+    if not (questions or options):
+        return None
+    return shuffle_for(app.config["SHUFFLE_KEY"], exam_id, roll, n, questions, options)
+
+
+def saved_answers(payload, answers, shuffle):
+    # Checkpointed answers (key order, real options) → {question id: shown letter}
+    if not answers:
+        return {}
+    saved = {}
+    for i, v in enumerate(answers):
+        if v:
+            shown = shuffle.options[i].index(v - 1) if shuffle else v - 1
+            saved[str(payload.questions[i]["id"])] = OPTIONS[shown]
+    return saved
+
+
+@exam_scheduler.add_hook
+def render_papers(con, exam_ids):
+    paper_cache.warm(con, exam_ids)
+
+
+@exam_scheduler.add_hook
+def forget_deadlines(con, exam_ids):
+    for exam_id in exam_ids:
+        exam_deadlines.drop(exam_id)
+
+
+@exam_scheduler.add_hook
+def forget_payloads(con, exam_ids):
+    for exam_id in exam_ids:
+        exam_payloads.evict(exam_id)
+
+
+@exam_scheduler.add_hook
+def announce_close(con, exam_ids):
+    for exam_id in exam_ids:
+        exam_events.publish(exam_id, {"type": "closed"})
+        exam_events.forget(exam_id)
+
+
+@exam_scheduler.add_hook
+def notify_parents(con, exam_ids):
+    for exam_id in exam_ids:
+        publish_results(con, exam_id)
+    sms_dispatcher.wake()
 
-    for e in cur.execute("SELECT * FROM exams WHERE status='ACTIVE'"):
-        end = datetime.fromisoformat(e["start_time"]) + timedelta(minutes=e["duration"])
-        if now >= end:
-            cur.execute("UPDATE exams SET status='INACTIVE' WHERE id=?", (e["id"],))
 
-    con.commit()
-    con.close()
+if BACKGROUND and os.getenv("EXAM_SCHEDULER", "1") == "1":
+    exam_scheduler.load()
+    exam_scheduler.start()
 
 # =========================
 # HOME
@@ -168,12 +369,14 @@ def admin_login():
 
         con = db()
         admin = con.execute(
-            "SELECT * FROM admin WHERE username=? AND password=?",
-            (username, password)
+            "SELECT password FROM admin WHERE username=?",
+            (username,)
         ).fetchone()
+        ok = verify_login(con, "admin", "username", username,
+                          admin["password"] if admin else None, password)
         con.close()
 
-        if admin:
+        if ok:
             session["admin"] = username
             return redirect("/admin/dashboard")
         else:
@@ -182,22 +385,87 @@ def admin_login():
     return render_template("admin_login.html")
 
 
+@app.route("/admin/db_stats")
+def admin_db_stats():
+    if "admin" not in session:
+        return redirect("/admin_login")
+
+    return jsonify(pool.stats())
+
+
+@app.route("/admin/perf", methods=["GET", "POST"])
+def admin_perf():
+    if "admin" not in session:
+        return redirect("/admin_login")
+
+    if request.method == "POST":
+        action = request.form.get("action")
+        if action in ("enable", "disable"):
+            profiler.enabled = action == "enable"
+        elif action == "reset":
+            profiler.reset()
+        return redirect("/admin/perf")
+
+    report = profiler.report()
+    if request.args.get("format") == "json":
+        return jsonify(report)
+    return render_template("admin_perf.html", perf=report)
+
+
+@app.route("/admin/papers_archive")
+def admin_papers_archive():
+    if "admin" not in session:
+        return redirect("/admin_login")
+
+    con = db()
+    exam_ids = closed_exams(
+        con,
+        request.args.get("year"),
+        request.args.get("branch"),
+        request.args.get("section")
+    )
+
+    # Question papers + answer keys rendered across worker processes
+    output = tempfile.TemporaryFile(suffix=".zip")
+    count = build_archive(con, exam_ids, output, workers=app.config["PAPER_WORKERS"])
+    con.close()
+
+    if not count:
+        output.close()
+        return "❌ No closed exams with archived papers"
+
+    output.seek(0)
+    return send_file(
+        output,
+        as_attachment=True,
+        download_name="question_papers.zip",
+        mimetype="application/zip"
+    )
+
+
 @app.route("/admin/dashboard", methods=["GET"])
 def admin_dashboard():
     if "admin" not in session:
         return redirect("/admin_login")
 
     con = db()
-    faculty = con.execute("SELECT * FROM faculty").fetchall()
-    students = con.execute("SELECT * FROM students").fetchall()
-    exams = con.execute("SELECT * FROM exams").fetchall()
+    page = paginate(
+        con, "SELECT emp_id, name FROM faculty WHERE 1=1", [],
+        [("emp_id", "emp_id")], request.args, request.path
+    )
     con.close()
 
-    return render_template(
+    totals = {
+        "students": counted_total("SELECT roll FROM students", ()),
+        "exams": counted_total("SELECT id FROM exams", ()),
+        "submitted": exam_stats_total("submitted", "1=1", ()),
+    }
+
+    return render_listing(
         "admin_dashboard.html",
-        faculty=faculty,
-        students=students,
-        exams=exams
+        "partials/faculty_rows.html",
+        page,
+        totals=totals
     )
 
 @app.route("/admin/add_faculty", methods=["POST"])
@@ -225,7 +493,7 @@ def add_faculty():
 
     con.execute(
         "INSERT INTO faculty (emp_id, name, password) VALUES (?,?,?)",
-        (emp_id, name, password)
+        (emp_id, name, hasher.hash(password))
     )
 
     con.commit()
@@ -258,35 +526,21 @@ def upload_students():
 
         # Check if section already exists
         con = db()
-        existing = con.execute("""
-            SELECT COUNT(*) FROM students
-            WHERE year=? AND branch=? AND section=?
-        """, (year, branch, section)).fetchone()[0]
+        existing = con.execute(
+            queries.STUDENTS_IN_CLASS, (year, branch, section)
+        ).fetchone()[0]
 
         if existing > 0:
             con.close()
             return "❌ Students already uploaded for this Year + Branch + Section. Please bulk delete first."
 
-        # Read Excel
-        df = pd.read_excel(file)
-
-        for _, row in df.iterrows():
-            con.execute("""
-                INSERT INTO students
-                (roll, name, parent, year, branch, section)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                row["roll"],
-                row["name"],
-                str(row["parent"]),
-                year,
-                branch,
-                section
-            ))
-
-        con.commit()
+        # Stream Excel/CSV in chunks → validate → executemany per chunk
+        report = import_students(con, iter_chunks(file), year, branch, section)
         con.close()
 
+        if report["errors"]:
+            return render_template("admin_upload_students.html", report=report)
+
         return redirect("/admin/dashboard")
 
     return render_template("admin_upload_students.html")
@@ -302,27 +556,19 @@ def admin_view_students():
 
     con = db()
 
-    query = "SELECT * FROM students WHERE 1=1"
-    params = []
+    where, params = queries.class_filter(None, year, branch, section)
+    query = queries.STUDENT_LIST + where
 
-    if year:
-        query += " AND year=?"
-        params.append(year)
-
-    if branch:
-        query += " AND branch=?"
-        params.append(branch)
-
-    if section:
-        query += " AND section=?"
-        params.append(section)
-
-    students = con.execute(query, params).fetchall()
+    page = paginate(
+        con, query, params, queries.STUDENT_KEYS, request.args, request.path,
+        total=counted_total(query.replace("SELECT *", "SELECT roll", 1), params)
+    )
     con.close()
 
-    return render_template(
+    return render_listing(
         "admin_view_students.html",
-        students=students,
+        "partials/student_rows.html",
+        page,
         year=year,
         branch=branch,
         section=section
@@ -340,14 +586,26 @@ def update_student(roll):
     section = request.form.get("section")
 
     con = db()
+    old = con.execute(
+        "SELECT year, branch, section FROM students WHERE roll=?", (roll,)
+    ).fetchone()
     con.execute("""
         UPDATE students
         SET name=?, parent=?, year=?, branch=?, section=?
         WHERE roll=?
     """, (name, parent, year, branch, section, roll))
 
+    # Moved to another class → enrolment moves with the student
+    if old and tuple(old) != (year, branch, section):
+        stats.enrolled_changed(con, *old, -1)
+        stats.enrolled_changed(con, year, branch, section, 1)
+
+    # Cached session profile is stale now → sign the student in again
+    ended = session_store.end_sessions(con, [f"student:{roll}"])
+
     con.commit()
     con.close()
+    session_store.forget(ended)
 
     return redirect("/admin/view_students")
 
@@ -357,9 +615,16 @@ def delete_student(roll):
         return redirect("/admin_login")
 
     con = db()
-    con.execute("DELETE FROM students WHERE roll=?", (roll,))
+    old = con.execute(
+        "DELETE FROM students WHERE roll=? RETURNING year, branch, section", (roll,)
+    ).fetchone()
+    ended = []
+    if old:
+        stats.enrolled_changed(con, *old, -1)
+        ended = session_store.end_sessions(con, [f"student:{roll}"])
     con.commit()
     con.close()
+    session_store.forget(ended)
 
     return redirect("/admin/view_students")
 
@@ -380,19 +645,35 @@ def bulk_delete_students():
         con = db()
 
         if section:
-            con.execute("""
+            sections = con.execute("""
+                SELECT section, COUNT(*) FROM students
+                WHERE year=? AND branch=? AND section=?
+            """, (year, branch, section)).fetchall()
+            rolls = con.execute("""
                 DELETE FROM students
                 WHERE year=? AND branch=? AND section=?
-            """, (year, branch, section))
+                RETURNING roll
+            """, (year, branch, section)).fetchall()
         else:
             # LE students → no section
-            con.execute("""
+            sections = con.execute("""
+                SELECT section, COUNT(*) FROM students
+                WHERE year=? AND branch=?
+                GROUP BY section
+            """, (year, branch)).fetchall()
+            rolls = con.execute("""
                 DELETE FROM students
                 WHERE year=? AND branch=?
-            """, (year, branch))
+                RETURNING roll
+            """, (year, branch)).fetchall()
+
+        for sec, n in sections:
+            stats.enrolled_changed(con, year, branch, sec, -n)
+        ended = session_store.end_sessions(con, (f"student:{r[0]}" for r in rolls))
 
         con.commit()
         con.close()
+        session_store.forget(ended)
 
         return redirect("/admin/view_students")
 
@@ -408,34 +689,38 @@ def admin_results():
     section = request.args.get("section", "")
     date = request.args.get("date", "")
 
-    query = """
-        SELECT r.roll, s.name, s.year, s.branch, s.section,
-               r.marks, r.submit_time
-        FROM results r
-        JOIN students s ON r.roll=s.roll
-        JOIN exams e ON r.exam_id=e.id
-        WHERE 1=1
-    """
-    params = []
+    # Class filter on the exam → same rows as the exam_stats total
+    where, params = queries.class_filter("e", year, branch, section)
+    query = queries.ADMIN_RESULTS + where
+    stats_where, stats_params = "1=1" + where, list(params)
+    arm, arm_params = queries.ADMIN_RESULTS_OF_EXAM, []
+
+    if date:
+        query += queries.RESULTS_ON_DATE
+        params += [date, date]
+        arm += queries.RESULTS_ON_DATE
+        arm_params += [date, date]
 
-    if year:
-        query += " AND s.year=?"
-        params.append(year)
-    if branch:
-        query += " AND s.branch=?"
-        params.append(branch)
-    if section:
-        query += " AND s.section=?"
-        params.append(section)
     if date:
-        query += " AND DATE(r.submit_time)=?"
-        params.append(date)
+        total = counted_total(query, params)
+    else:
+        total = exam_stats_total("submitted", stats_where, stats_params)
 
     con = db()
-    rows = con.execute(query, params).fetchall()
+    # Without a class filter idx_results_time already walks in order
+    exams = con.execute(queries.CLASS_EXAMS + where, stats_params).fetchall() if where else None
+    page = results_page(con, query, params, arm, arm_params, exams, total)
     con.close()
 
-    return render_template("admin_results.html", rows=rows)
+    return render_listing(
+        "admin_results.html",
+        "partials/admin_result_rows.html",
+        page,
+        year=year,
+        branch=branch,
+        section=section,
+        date=date
+    )
 
 
 @app.route("/admin/reset_student_password/<roll>", methods=["GET", "POST"])
@@ -461,10 +746,12 @@ def admin_reset_student_password(roll):
 
         con.execute(
             "UPDATE students SET password=? WHERE roll=?",
-            (new_password, roll)
+            (hasher.hash(new_password), roll)
         )
+        ended = session_store.end_sessions(con, [f"student:{roll}"])
         con.commit()
         con.close()
+        session_store.forget(ended)
 
         return redirect("/admin/view_students")
 
@@ -485,46 +772,35 @@ def admin_attendance():
     section = request.args.get("section")
     date = request.args.get("date")
 
-    query = """
-        SELECT
-            s.roll,
-            s.name,
-            s.year,
-            s.branch,
-            s.section,
-            e.exam_date,
-            r.marks,
-            a.status
-        FROM attendance a
-        JOIN students s ON a.roll = s.roll
-        JOIN exams e ON a.exam_id = e.id
-        LEFT JOIN results r
-            ON r.roll = s.roll AND r.exam_id = e.id
-        WHERE 1=1
-    """
-    params = []
-
-    if year:
-        query += " AND s.year=?"
-        params.append(year)
-
-    if branch:
-        query += " AND s.branch=?"
-        params.append(branch)
-
-    if section and section != "all":
-        query += " AND s.section=?"
-        params.append(section)
+    if section == "all":
+        section = None
 
+    # Class and date are the exam's → same rows as the exam_stats total
+    where, filters = queries.class_filter("e", year, branch, section)
     if date:
-        query += " AND e.exam_date=?"
-        params.append(date)
+        where += queries.EXAMS_ON_DATE
+        filters.append(date)
+    total = exam_stats_total("present", "1=1" + where, filters)
 
     con = db()
-    rows = con.execute(query, params).fetchall()
+    # Filtered → one attendance PK range per matching exam, merged; the
+    # unfiltered listing already walks the PK in order
+    exams = con.execute(queries.CLASS_EXAMS + where, filters).fetchall() if where else None
+    if exams is not None and len(exams) <= MAX_MERGE_ARMS:
+        query, params, merge = queries.ADMIN_ATTENDANCE_OF_EXAM, [], [tuple(r) for r in exams]
+    else:
+        query, params, merge = queries.ADMIN_ATTENDANCE + where, filters, None
+    page = paginate(
+        con, query, params, queries.ATTENDANCE_KEYS,
+        request.args, request.path, descending=True, total=total, merge=merge
+    )
     con.close()
 
-    return render_template("admin_attendance.html", rows=rows)
+    return render_listing(
+        "admin_attendance.html",
+        "partials/attendance_rows.html",
+        page
+    )
 
 #================================
 # FACULTY LOGIN
@@ -537,12 +813,13 @@ def faculty_login():
 
         con = db()
         f = con.execute(
-            "SELECT * FROM faculty WHERE emp_id=? AND password=?",
-            (emp, pwd)
+            "SELECT password FROM faculty WHERE emp_id=?",
+            (emp,)
         ).fetchone()
+        ok = verify_login(con, "faculty", "emp_id", emp, f["password"] if f else None, pwd)
         con.close()
 
-        if f:
+        if ok:
             session["faculty"] = emp   # 🔴 MUST EXIST
             return redirect("/faculty/dashboard")
 
@@ -556,18 +833,8 @@ def faculty_dashboard():
 
     con = db()
 
-    exams = con.execute("""
-        SELECT e.*,
-               (
-                   SELECT COUNT(*)
-                   FROM students
-                   WHERE year = e.year
-                     AND branch = e.branch
-                     AND section = e.section
-               ) AS student_count
-        FROM exams e
-        ORDER BY e.id DESC
-    """).fetchall()
+    # Class size and submissions come from exam_stats (kept by the write paths)
+    exams = con.execute(queries.FACULTY_EXAMS).fetchall()
 
     con.close()
 
@@ -599,10 +866,9 @@ def create_exam():
         con = db()
 
         # 🔴 BLOCK IF ACTIVE EXAM EXISTS
-        active = con.execute("""
-            SELECT COUNT(*) FROM exams
-            WHERE year=? AND branch=? AND section=? AND status='ACTIVE'
-        """, (year, branch, section)).fetchone()[0]
+        active = con.execute(
+            queries.ACTIVE_EXAMS_IN_CLASS, (year, branch, section)
+        ).fetchone()[0]
 
         if active > 0:
             con.close()
@@ -613,10 +879,9 @@ def create_exam():
             )
 
         # Load students
-        students = con.execute("""
-            SELECT roll, name FROM students
-            WHERE year=? AND branch=? AND section=?
-        """, (year, branch, section)).fetchall()
+        students = con.execute(
+            queries.CLASS_ROSTER, (year, branch, section)
+        ).fetchall()
 
         # Preview students
         if "preview" in request.form:
@@ -638,13 +903,14 @@ def create_exam():
             return "❌ Cannot create exam without students"
 
         # Create exam (INACTIVE first)
-        con.execute("""
+        cur = con.execute("""
             INSERT INTO exams
             (emp_id, year, branch, section, duration, status, start_time, exam_date)
             VALUES (?, ?, ?, ?, ?, 'INACTIVE', '', DATE('now'))
         """, (
             session["faculty"], year, branch, section, duration
         ))
+        stats.exam_created(con, cur.lastrowid, len(students))
 
         con.commit()
         con.close()
@@ -660,22 +926,21 @@ def upload_questions(exam_id):
 
     if request.method == "POST":
         file = request.files["file"]
-        df = pd.read_excel(file)
 
         con = db()
-        for _, r in df.iterrows():
-            con.execute("""
-                INSERT INTO questions
-                (exam_id, question, a, b, c, d, correct)
-                VALUES (?,?,?,?,?,?,?)
-            """, (
-                exam_id,
-                r["question"], r["a"], r["b"],
-                r["c"], r["d"], r["correct"]
-            ))
-        con.commit()
+        # Committed together with the questions → every worker's cached
+        # payload of this exam goes stale
+        con.execute("UPDATE exams SET revision = revision + 1 WHERE id=?", (exam_id,))
+        report = import_questions(con, iter_chunks(file), exam_id)
         con.close()
 
+        # Questions changed → compiled key and rendered payload are stale
+        invalidate_answer_key(exam_id)
+        exam_payloads.evict(exam_id)
+
+        if report["inserted"] == 0 and report["errors"]:
+            return "❌ " + report["errors"][0]["error"]
+
         return redirect("/faculty/dashboard")
 
     return render_template("faculty_upload_questions.html", exam_id=exam_id)
@@ -688,10 +953,7 @@ def start_exam(exam_id):
     con = db()
 
     # Check questions count
-    qcount = con.execute(
-        "SELECT COUNT(*) FROM questions WHERE exam_id=?",
-        (exam_id,)
-    ).fetchone()[0]
+    qcount = con.execute(queries.QUESTION_COUNT, (exam_id,)).fetchone()[0]
 
     if qcount == 0:
         con.close()
@@ -704,7 +966,22 @@ def start_exam(exam_id):
         WHERE id=?
     """, (exam_id,))
 
+    # Archive the paper now; it is listed once the exam closes
+    snapshot_paper(con, exam_id)
+
     con.commit()
+
+    # A restarted exam's old PDF holds the answers → gone until it closes
+    paper_cache.invalidate(exam_id)
+
+    # Compile the answer key once, before the first submission arrives
+    build_answer_key(con, exam_id)
+
+    # Render the question set once, before the first student opens it
+    exam_payloads.build(con, exam_id)
+
+    # Auto-close at start_time + duration
+    exam_scheduler.schedule_from_db(con, exam_id)
     con.close()
 
     return redirect("/faculty/dashboard")
@@ -722,34 +999,14 @@ def monitor_exam(exam_id):
         (exam_id,)
     ).fetchone()
 
-    # Total students for this exam section
-    total = con.execute("""
-        SELECT COUNT(*) FROM students
-        WHERE year=? AND branch=? AND section=?
-    """, (exam["year"], exam["branch"], exam["section"])).fetchone()[0]
-
-    # Submitted count
-    submitted = con.execute("""
-        SELECT COUNT(*) FROM results
-        WHERE exam_id=?
-    """, (exam_id,)).fetchone()[0]
+    # Class size and submitted count
+    counts = con.execute(queries.EXAM_COUNTERS, (exam_id,)).fetchone()
+    total, submitted = tuple(counts) if counts else (0, 0)
 
     writing = total - submitted
 
     # Student-wise status
-    students = con.execute("""
-        SELECT s.roll, s.name,
-               CASE
-                   WHEN r.roll IS NOT NULL THEN 'SUBMITTED'
-                   ELSE 'WRITING'
-               END AS status,
-               r.marks
-        FROM students s
-        LEFT JOIN results r
-            ON s.roll = r.roll AND r.exam_id=?
-        WHERE s.year=? AND s.branch=? AND s.section=?
-        ORDER BY s.roll
-    """, (
+    students = con.execute(queries.MONITOR_STUDENTS, (
         exam_id,
         exam["year"], exam["branch"], exam["section"]
     )).fetchall()
@@ -765,6 +1022,26 @@ def monitor_exam(exam_id):
         writing=writing
     )
 
+@app.route("/faculty/monitor/<int:exam_id>/stream")
+def monitor_stream(exam_id):
+    if "faculty" not in session:
+        return redirect("/faculty_login")
+
+    def load_counts():
+        con = db()
+        counts = con.execute(queries.EXAM_COUNTERS, (exam_id,)).fetchone()
+        con.close()
+        return tuple(counts) if counts else (0, 0)
+
+    # Counters come from memory after the first watcher of this exam
+    first = {"type": "counters", **exam_events.counters(exam_id, load_counts)}
+
+    return Response(
+        stream_with_context(stream(exam_events, exam_id, first)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route("/faculty/results", methods=["GET"])
 def faculty_results():
 
@@ -779,37 +1056,31 @@ def faculty_results():
 
     con = db()
 
-    query = """
-        SELECT r.roll, s.name, r.marks, r.submit_time,
-               e.year, e.branch, e.section, e.id AS exam_id
-        FROM results r
-        JOIN students s ON s.roll = r.roll
-        JOIN exams e ON e.id = r.exam_id
-        WHERE e.emp_id = ?
-    """
-    params = [session["faculty"]]
+    where, params = queries.class_filter("e", year, branch, section)
+    query = queries.FACULTY_RESULTS + where
+    params = [session["faculty"]] + params
+    exams = con.execute(queries.FACULTY_EXAM_IDS + where, params).fetchall()
+    arm, arm_params = queries.FACULTY_RESULTS_OF_EXAM, []
 
-    if year:
-        query += " AND e.year=?"
-        params.append(year)
-    if branch:
-        query += " AND e.branch=?"
-        params.append(branch)
-    if section:
-        query += " AND e.section=?"
-        params.append(section)
-    if date:
-        query += " AND DATE(r.submit_time)=?"
-        params.append(date)
-
-    query += " ORDER BY r.submit_time DESC"
+    # Every filter except the date is on the exam → exam_stats has the total
+    stats_where = "e.emp_id = ?" + where
 
-    rows = con.execute(query, params).fetchall()
+    if date:
+        query += queries.RESULTS_ON_DATE
+        params += [date, date]
+        arm += queries.RESULTS_ON_DATE
+        arm_params += [date, date]
+        total = counted_total(query, params)
+    else:
+        total = exam_stats_total("submitted", stats_where, params)
+
+    page = results_page(con, query, params, arm, arm_params, exams, total)
     con.close()
 
-    return render_template(
+    return render_listing(
         "faculty_results.html",
-        rows=rows,
+        "partials/faculty_result_rows.html",
+        page,
         fy=year,
         fb=branch,
         fs=section,
@@ -832,6 +1103,7 @@ def export_results():
 
     query = """
         SELECT r.roll, s.name, r.marks, r.submit_time,
+               CASE WHEN r.late THEN 'Yes' ELSE 'No' END,
                e.year, e.branch, e.section
         FROM results r
         JOIN students s ON s.roll = r.roll
@@ -840,32 +1112,43 @@ def export_results():
     """
     params = [session["faculty"]]
 
+    stats_where = "e.emp_id = ?"
+
     if year:
-        query += " AND e.year=?"; params.append(year)
+        query += " AND e.year=?"; stats_where += " AND e.year=?"; params.append(year)
     if branch:
-        query += " AND e.branch=?"; params.append(branch)
+        query += " AND e.branch=?"; stats_where += " AND e.branch=?"; params.append(branch)
     if section:
-        query += " AND e.section=?"; params.append(section)
+        query += " AND e.section=?"; stats_where += " AND e.section=?"; params.append(section)
+
     if date:
-        query += " AND DATE(r.submit_time)=?"; params.append(date)
+        query += " AND r.submit_time >= ? AND r.submit_time < DATE(?, '+1 day')"
+        params += [date, date]
+        total = counted_total(query, params)
+    else:
+        total = exam_stats_total("submitted", stats_where, params)
+
+    query += " ORDER BY r.submit_time, r.roll"
+    header = ["Roll", "Name", "Marks", "Submitted At", "Late", "Year", "Branch", "Section"]
+
+    # CSV on request, or when the export is too big to zip up front:
+    # rows go out as they are read, so the download starts immediately
+    fmt = request.args.get("format", "xlsx")
+    if fmt == "csv" or total > app.config["EXPORT_XLSX_MAX_ROWS"]:
+        return Response(
+            stream_with_context(stream_csv(header, iter_rows(con, query, params))),
+            mimetype="text/csv",
+            headers={"Content-Disposition": "attachment; filename=exam_results.csv"}
+        )
 
-    rows = con.execute(query, params).fetchall()
+    output = write_xlsx(header, iter_rows(con, query, params))
     con.close()
 
-    df = pd.DataFrame(rows, columns=[
-        "Roll", "Name", "Marks", "Submitted At",
-        "Year", "Branch", "Section"
-    ])
-
-    output = BytesIO()
-    df.to_excel(output, index=False)
-    output.seek(0)
-
     return send_file(
         output,
         as_attachment=True,
         download_name="exam_results.xlsx",
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        mimetype=XLSX_MIMETYPE
     )
 
 
@@ -878,25 +1161,89 @@ def end_exam(exam_id):
     con = db()
 
     # Only creator can end
+    exam = con.execute(queries.OWN_ACTIVE_EXAM, (exam_id, session["faculty"])).fetchone()
+
+    if not exam:
+        con.close()
+        return "❌ You cannot end this exam"
+
+    # Same close path as the scheduler → papers archived, parents notified
+    exam_scheduler.close_exams(con, [exam_id])
+    con.close()
+
+    return redirect("/faculty/dashboard")
+
+
+@app.route("/faculty/publish_results/<int:exam_id>")
+def publish_exam_results(exam_id):
+
+    if "faculty" not in session:
+        return redirect("/faculty_login")
+
+    con = db()
+
+    # Only creator can publish, and only once the exam has ended
     exam = con.execute("""
         SELECT id FROM exams
-        WHERE id=? AND emp_id=? AND status='ACTIVE'
+        WHERE id=? AND emp_id=? AND status='INACTIVE'
     """, (exam_id, session["faculty"])).fetchone()
 
     if not exam:
         con.close()
-        return "❌ You cannot end this exam"
+        return "❌ You cannot publish results for this exam"
 
-    con.execute("""
-        UPDATE exams 
-        SET status='INACTIVE'
-        WHERE id=?
-    """, (exam_id,))
+    # One query → one message per parent phone → outbox
+    publish_results(con, exam_id)
+    con.close()
 
-    con.commit()
+    sms_dispatcher.wake()
+
+    return redirect(f"/faculty/publish_status/{exam_id}")
+
+
+@app.route("/faculty/publish_status/<int:exam_id>")
+def publish_status(exam_id):
+
+    if "faculty" not in session:
+        return redirect("/faculty_login")
+
+    con = db()
+    report = publish_report(con, exam_id)
     con.close()
 
-    return redirect("/faculty/dashboard")
+    return render_template(
+        "faculty_publish_status.html",
+        exam_id=exam_id,
+        report=report
+    )
+
+
+@app.route("/faculty/regrade/<int:exam_id>")
+def regrade(exam_id):
+
+    if "faculty" not in session:
+        return redirect("/faculty_login")
+
+    con = db()
+
+    # Only creator can re-grade
+    exam = con.execute("""
+        SELECT id FROM exams
+        WHERE id=? AND emp_id=?
+    """, (exam_id, session["faculty"])).fetchone()
+
+    if not exam:
+        con.close()
+        return "❌ You cannot re-grade this exam"
+
+    report = regrade_exam(con, exam_id)
+    con.close()
+
+    return (
+        f"✅ Re-graded {report['students']} submissions, "
+        f"{report['changed']} marks changed ({report['ms']} ms). "
+        f"<a href='/faculty/dashboard'>Back</a>"
+    )
 
 
 @app.route("/faculty/delete_exam/<int:exam_id>")
@@ -925,15 +1272,22 @@ def delete_exam(exam_id):
         return "❌ Stop the exam before deleting"
 
     # ✅ DELETE EVERYTHING (SAFE)
-    con.execute("DELETE FROM questions WHERE exam_id=?", (exam_id,))
-    con.execute("DELETE FROM results WHERE exam_id=?", (exam_id,))
-    con.execute("DELETE FROM attendance WHERE exam_id=?", (exam_id,))
-    con.execute("DELETE FROM exam_papers WHERE exam_id=?", (exam_id,))
+    for sql in queries.EXAM_ROWS:
+        con.execute(sql, (exam_id,))
+    delete_paper(con, exam_id)
     con.execute("DELETE FROM exams WHERE id=?", (exam_id,))
+    stats.exam_deleted(con, exam_id)
 
     con.commit()
     con.close()
 
+    invalidate_answer_key(exam_id)
+    exam_deadlines.drop(exam_id)
+    exam_events.forget(exam_id)
+    exam_payloads.evict(exam_id)
+    answer_log.drop(exam_id)
+    paper_cache.invalidate(exam_id)
+
     return redirect("/faculty/dashboard")
 
 
@@ -943,13 +1297,7 @@ def attendance_report(exam_id):
         return redirect("/faculty_login")
 
     con = db()
-    rows = con.execute("""
-        SELECT s.roll,s.name,
-        IFNULL(a.status,'ABSENT') AS status
-        FROM students s
-        LEFT JOIN attendance a
-        ON s.roll=a.roll AND a.exam_id=?
-    """, (exam_id,)).fetchall()
+    rows = con.execute(queries.EXAM_ATTENDANCE, (exam_id,)).fetchall()
     con.close()
 
     return render_template("attendance.html", rows=rows)
@@ -959,6 +1307,28 @@ def attendance_report(exam_id):
 #==========================
 # STUDENT LOGIN
 #==========================
+# The profile is read once at login and kept in the session; student
+# pages take the class from there instead of querying students again.
+PROFILE_FIELDS = ("roll", "name", "year", "branch", "section")
+
+def remember_student(student):
+    session["student"] = student["roll"]
+    session["profile"] = {f: student[f] for f in PROFILE_FIELDS}
+
+def student_profile(con):
+    profile = session.get("profile")
+    if profile is None or profile.get("roll") != session["student"]:
+        # sessions from before the profile was cached
+        student = con.execute(
+            "SELECT roll, name, year, branch, section FROM students WHERE roll=?",
+            (session["student"],)
+        ).fetchone()
+        if not student:
+            return None
+        remember_student(student)
+        profile = session["profile"]
+    return profile
+
 @app.route("/student_login", methods=["GET", "POST"])
 def student_login():
     msg = ""
@@ -975,18 +1345,20 @@ def student_login():
 
         if not student:
             msg = "❌ Roll number not found"
+        elif not verify_login(con, "students", "roll", roll, student["password"], pwd):
+            msg = "❌ Incorrect password"
         elif new_pwd:
-            # Change password
+            # Change password (current one verified above)
             con.execute(
                 "UPDATE students SET password=? WHERE roll=?",
-                (new_pwd, roll)
+                (hasher.hash(new_pwd), roll)
             )
+            ended = session_store.end_sessions(con, [f"student:{roll}"])
             con.commit()
+            session_store.forget(ended)
             msg = "✅ Password updated successfully"
-        elif student["password"] != pwd:
-            msg = "❌ Incorrect password"
         else:
-            session["student"] = roll
+            remember_student(student)
             con.close()
             return redirect("/student/dashboard")
 
@@ -999,38 +1371,25 @@ def student_dashboard():
     if "student" not in session:
         return redirect("/student_login")
 
-    roll = session["student"]
     con = db()
+    student = student_profile(con)
 
-    student = con.execute(
-        "SELECT * FROM students WHERE roll=?",
-        (roll,)
-    ).fetchone()
+    if not student:
+        con.close()
+        return "❌ Student not found"
 
     # Active exams only for this student
-    active_exams = con.execute("""
-        SELECT * FROM exams
-        WHERE status='ACTIVE'
-        AND year=? AND branch=? AND section=?
-    """, (
-        student["year"], student["branch"], student["section"]
-    )).fetchall()
-
-    # Previous papers (completed exams)
-    papers = con.execute("""
-        SELECT DISTINCT exam_id FROM exam_papers
-        WHERE year=? AND branch=? AND section=?
-    """, (
+    active_exams = con.execute(queries.STUDENT_ACTIVE_EXAMS, (
         student["year"], student["branch"], student["section"]
     )).fetchall()
 
     con.close()
 
+    # Previous papers are listed on /student/papers
     return render_template(
         "student_dashboard.html",
         student=student,
-        active_exams=active_exams,
-        papers=papers
+        active_exams=active_exams
     )
 
 
@@ -1047,7 +1406,8 @@ def student_change_password():
             (roll,)
         ).fetchone()
 
-        if not student or student["password"] != old_pass:
+        if not verify_login(con, "students", "roll", roll,
+                            student["password"] if student else None, old_pass):
             con.close()
             return render_template(
                 "change_password.html",
@@ -1056,11 +1416,13 @@ def student_change_password():
 
         con.execute(
             "UPDATE students SET password=? WHERE roll=?",
-            (new_pass, roll)
+            (hasher.hash(new_pass), roll)
         )
+        ended = session_store.end_sessions(con, [f"student:{roll}"])
 
         con.commit()
         con.close()
+        session_store.forget(ended)
 
         return redirect("/student_login")
 
@@ -1077,156 +1439,78 @@ def student_exam(exam_id):
 
     try:
         # =========================
-        # FETCH STUDENT
+        # FETCH ACTIVE EXAM (cached question payload)
         # =========================
-        student = con.execute(
-            "SELECT * FROM students WHERE roll=?",
-            (roll,)
-        ).fetchone()
+        # Shared by the whole class → one read per exam, not per student
+        payload = exam_payloads.get(con, exam_id)
 
-        if not student:
-            return "❌ Student not found"
+        if not payload:
+            return "❌ Exam not active"
 
         # =========================
-        # FETCH ACTIVE EXAM
+        # FETCH STUDENT (session profile)
         # =========================
-        exam = con.execute(
-            "SELECT * FROM exams WHERE id=? AND status='ACTIVE'",
-            (exam_id,)
-        ).fetchone()
+        student = student_profile(con)
 
-        if not exam:
-            return "❌ Exam not active"
+        if not student:
+            return "❌ Student not found"
 
         # =========================
         # ELIGIBILITY CHECK
         # =========================
-        if (student["year"], student["branch"], student["section"]) != \
-           (exam["year"], exam["branch"], exam["section"]):
+        if not payload.eligible(student):
             return "❌ You are not eligible for this exam"
 
         # =========================
         # PREVENT DOUBLE SUBMISSION
         # =========================
-        already = con.execute(
-            "SELECT 1 FROM results WHERE roll=? AND exam_id=?",
-            (roll, exam_id)
+        already = submission_queue.is_pending(exam_id, roll) or con.execute(
+            queries.ALREADY_SUBMITTED, (roll, exam_id)
         ).fetchone()
 
         if already:
             return redirect("/student/dashboard")
 
         # =========================
-        # SUBMIT EXAM
+        # DEADLINE (server-side, cached)
         # =========================
-        if request.method == "POST":
+        now = time.time()
+        deadline = exam_deadlines.get(con, exam_id)
+        grace = app.config["SUBMIT_GRACE_SECONDS"]
 
-            questions = con.execute(
-                "SELECT * FROM questions WHERE exam_id=?",
-                (exam_id,)
-            ).fetchall()
-
-            score = 0
-            for q in questions:
-                ans = request.form.get(str(q["id"]))
-                if not ans:
-                    continue
-
-                correct = q["correct"]
-                if not correct:
-                    continue
-
-                if correct.strip().lower() in ["a", "b", "c", "d"]:
-                    if ans.strip().lower() == correct.strip().lower():
-                        score += 1
-                else:
-                    selected = {
-                        "a": q["a"],
-                        "b": q["b"],
-                        "c": q["c"],
-                        "d": q["d"]
-                    }.get(ans.strip().lower())
-
-                    if selected and selected.strip().lower() == correct.strip().lower():
-                        score += 1
+        if deadline is not None and now > deadline + grace:
+            return "❌ Exam time is over. Submission closed."
 
-            # =========================
-            # SAVE RESULT
-            # =========================
-            con.execute(
-                "INSERT OR IGNORE INTO results "
-                "(roll, exam_id, marks, submit_time) "
-                "VALUES (?,?,?,DATETIME('now'))",
-                (roll, exam_id, score)
-            )
+        late = deadline is not None and now > deadline
 
-            # =========================
-            # SAVE ATTENDANCE
-            # =========================
-            con.execute(
-                "INSERT OR IGNORE INTO attendance "
-                "(exam_id, roll, status, attended_on) "
-                "VALUES (?,?,?,DATE('now'))",
-                (exam_id, roll, "PRESENT")
-            )
+        # This student's order; derived again on submit, never stored
+        shuffle = student_shuffle(exam_id, roll, len(payload))
 
-            # =========================
-            # SAVE EXAM PAPER
-            # =========================
-            exists = con.execute(
-                "SELECT 1 FROM exam_papers WHERE exam_id=?",
-                (exam_id,)
-            ).fetchone()
-
-            if not exists:
-                for q in questions:
-                    con.execute("""
-                        INSERT INTO exam_papers
-                        (exam_id, year, branch, section, exam_date,
-                         question, a, b, c, d, correct)
-                        VALUES (?,?,?,?,?,?,?,?,?,?,?)
-                    """, (
-                        exam_id,
-                        exam["year"],
-                        exam["branch"],
-                        exam["section"],
-                        exam["exam_date"],
-                        q["question"],
-                        q["a"],
-                        q["b"],
-                        q["c"],
-                        q["d"],
-                        q["correct"]
-                    ))
+        # =========================
+        # SUBMIT EXAM
+        # =========================
+        if request.method == "POST":
 
-            con.commit()
+            # Compiled key → single pass over the form, no question reads;
+            # shown option letters are mapped back to the real ones. The
+            # form is complete; checkpoints only fill questions it lacks.
+            key = answer_key(con, exam_id, payload.revision)
+            saved = answer_log.answers(exam_id, roll, len(key))
+            score, answers = grade(key, request.form, shuffle, base=saved)
 
             # =========================
-            # SEND SMS TO PARENT (EN + TE)
-            # =========================
-                        # =========================
-            # SEND SMS TO PARENT (SAFE FIX)
+            # SAVE RESULT + ANSWERS + ATTENDANCE (write-behind)
             # =========================
-            parent_number = student["parent"]
-
-            # Auto add +91 if missing
-            if parent_number and not parent_number.startswith("+"):
-                parent_number = "+91" + parent_number
-
-            send_sms(
-                parent_number,
-                f"""
-KIET Exam Result
-
-Student: {student['name']}
-Roll: {student['roll']}
-Marks: {score}
-
-Year: {student['year']}
-Branch: {student['branch']}
-Section: {student['section']}
-"""
-            )
+            # Durably logged here, group-committed by submission_queue
+            submission_queue.submit({
+                "exam_id": exam_id,
+                "roll": roll,
+                "marks": score,
+                "answers": answers.hex(),
+                "late": int(late),
+                "submit_time": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now)),
+                "attended_on": time.strftime("%Y-%m-%d", time.gmtime(now)),
+            })
 
             return render_template(
                 "student_result.html",
@@ -1236,34 +1520,85 @@ Section: {student['section']}
         # =========================
         # LOAD QUESTIONS (GET)
         # =========================
-        questions = con.execute(
-            "SELECT id, question, a, b, c, d FROM questions WHERE exam_id=?",
-            (exam_id,)
-        ).fetchall()
+        if request.args.get("format") == "json":
+            return Response(payload.document(shuffle) if shuffle else payload.json,
+                            mimetype="application/json")
+
+        # Timer counts down to the server deadline, not from page load
+        seconds_left = payload.duration * 60
+        if deadline is not None:
+            seconds_left = max(0, int(deadline - now))
 
         return render_template(
             "student_exam.html",
-            questions=questions,
-            duration=exam["duration"]
+            exam_id=exam_id,
+            questions_html=payload.render(shuffle) if shuffle else payload.html,
+            duration=payload.duration,
+            seconds_left=seconds_left,
+            saved=saved_answers(payload, answer_log.answers(exam_id, roll, len(payload)), shuffle),
+            checkpoint_seconds=app.config["CHECKPOINT_SECONDS"]
         )
 
     finally:
         con.close()
 
+@app.route("/student/exam/<int:exam_id>/checkpoint", methods=["POST"])
+def student_checkpoint(exam_id):
+
+    if "student" not in session:
+        return jsonify({"error": "login required"}), 401
+
+    roll = session["student"]
+    changes = (request.get_json(silent=True) or {}).get("answers")
+    if not isinstance(changes, dict):
+        return jsonify({"error": "answers missing"}), 400
+
+    con = db()
+
+    try:
+        payload = exam_payloads.get(con, exam_id)
+        if not payload:
+            return jsonify({"error": "exam not active"}), 404
+
+        student = student_profile(con)
+        if not student or not payload.eligible(student):
+            return jsonify({"error": "not eligible"}), 403
+
+        # Submitted answers are final; a late tab must not change them
+        if submission_queue.is_pending(exam_id, roll) or con.execute(
+            queries.ALREADY_SUBMITTED, (roll, exam_id)
+        ).fetchone():
+            return jsonify({"error": "already submitted"}), 409
+
+        deadline = exam_deadlines.get(con, exam_id)
+        if deadline is not None and time.time() > deadline + app.config["SUBMIT_GRACE_SECONDS"]:
+            return jsonify({"error": "time over"}), 410
+
+        key = answer_key(con, exam_id, payload.revision)
+        shuffle = student_shuffle(exam_id, roll, len(payload))
+        changes = {str(k): v if isinstance(v, str) else "" for k, v in changes.items()}
+        saved = answer_log.record(exam_id, roll, encode_changes(key, changes, shuffle), len(key))
+
+        return jsonify({"saved": saved, "at": time.time()})
+
+    finally:
+        con.close()
+
+
 @app.route("/student/papers", methods=["GET"])
 def student_papers():
 
     if "student" not in session:
         return redirect("/student_login")
 
-    roll = session["student"]
     con = db()
 
-    # Fetch student info
-    student = con.execute(
-        "SELECT * FROM students WHERE roll=?",
-        (roll,)
-    ).fetchone()
+    # Class from the session profile
+    student = student_profile(con)
+
+    if not student:
+        con.close()
+        return "❌ Student not found"
 
     # Filters
     year = request.args.get("year", student["year"])
@@ -1271,26 +1606,8 @@ def student_papers():
     section = request.args.get("section", student["section"])
     date = request.args.get("date")
 
-    query = """
-        SELECT DISTINCT
-            exam_id,
-            year,
-            branch,
-            section,
-            exam_date
-        FROM exam_papers
-        WHERE year=? AND branch=? AND section=?
-    """
-
-    params = [year, branch, section]
-
-    if date:
-        query += " AND exam_date=?"
-        params.append(date)
-
-    query += " ORDER BY exam_date DESC"
-
-    papers = con.execute(query, params).fetchall()
+    # Closed exams only, newest first (paper_archive class index)
+    papers = list_papers(con, year, branch, section, date)
     con.close()
 
     return render_template(
@@ -1306,51 +1623,23 @@ def download_paper(exam_id):
         return redirect("/student_login")
 
     con = db()
-    qs = con.execute(
-        "SELECT * FROM exam_papers WHERE exam_id=?",
-        (exam_id,)
-    ).fetchall()
+    cached = paper_cache.get(con, exam_id)
     con.close()
 
-    if not qs:
+    if not cached:
         return "❌ Question paper not available"
 
-    buffer = BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=A4)
-    y = 800
-
-    for q in qs:
-        pdf.drawString(40, y, q["question"] or "")
-        y -= 20
-
-        pdf.drawString(60, y, "A) " + (q["a"] or ""))
-        y -= 15
-
-        pdf.drawString(60, y, "B) " + (q["b"] or ""))
-        y -= 15
-
-        pdf.drawString(60, y, "C) " + (q["c"] or ""))
-        y -= 15
-
-        pdf.drawString(60, y, "D) " + (q["d"] or ""))
-        y -= 15
-
-        pdf.drawString(60, y, "Answer: " + (q["correct"] or ""))
-        y -= 30
-
-        # New page if space ends
-        if y < 100:
-            pdf.showPage()
-            y = 800
-
-    pdf.save()
-    buffer.seek(0)
+    path, digest = cached
 
+    # ETag = paper digest → If-None-Match gets a 304, Range gets a 206
     return send_file(
-        buffer,
+        path,
         as_attachment=True,
         download_name=f"exam_{exam_id}_paper.pdf",
-        mimetype="application/pdf"
+        mimetype="application/pdf",
+        conditional=True,
+        etag=digest,
+        max_age=3600
     )
 
 # =========================
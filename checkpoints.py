@@ -0,0 +1,195 @@
+import fcntl, glob, json, os, threading, time
+
+
+# =========================
+# ANSWER CHECKPOINTS
+# =========================
+# The exam page sends what changed every few seconds; each delta is
+# appended to one log file per exam, shared by every worker process.
+# Each process keeps a compacted copy of every student's answers (one
+# byte per question in answer-key order, as in grading.encode_answers)
+# and brings it up to date by reading the log from where it stopped
+# before every read, so a checkpoint taken by one worker is seen by all.
+# The final submit still posts the whole form; checkpoints only fill in
+# what it lacks, and an exam that closes grades the students who never
+# submitted from their last checkpoint.
+#
+# Log lines:
+#   {"r": roll, "d": [[position, 0-4], ...], "t": time}   → delta
+#   {"r": roll, "s": "<hex answers>", "t": time}          → full state
+# Once a log holds `compact_every` deltas it is rewritten as one
+# full-state line per student. Appends and reads hold a shared flock on
+# <log>.lock, compaction an exclusive one; a process that finds the log
+# replaced (new inode) reopens it and reads it again from the start.
+class ExamLog:
+
+    __slots__ = ("path", "lock", "answers", "saved_at", "inode", "offset", "deltas")
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.answers = {}             # roll → bytearray
+        self.saved_at = {}            # roll → time of the last checkpoint
+        self.inode = None             # log file the state was read from
+        self.offset = 0               # bytes of it applied so far
+        self.deltas = 0
+
+    def reset(self, inode):
+        self.answers.clear()
+        self.saved_at.clear()
+        self.inode = inode
+        self.offset = 0
+        self.deltas = 0
+
+
+class AnswerLog:
+
+    def __init__(self, log_dir="answer_log", durable=True, compact_every=20000):
+        self.log_dir = log_dir
+        self.durable = durable
+        self.compact_every = compact_every
+        self._logs = {}
+        self._lock = threading.Lock()
+        os.makedirs(log_dir, exist_ok=True)
+
+    def path(self, exam_id):
+        return os.path.join(self.log_dir, f"exam_{exam_id}.log")
+
+    def _log(self, exam_id):
+        log = self._logs.get(exam_id)
+        if log is None:
+            with self._lock:
+                log = self._logs.setdefault(exam_id, ExamLog(self.path(exam_id)))
+        return log
+
+    def _flock(self, log, mode):
+        fd = os.open(log.path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, mode)
+        return fd
+
+    @staticmethod
+    def _unlock(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    # ---------- catching up with the log ----------
+    def _refresh(self, log):
+        # Caller holds log.lock and a flock on the log
+        try:
+            st = os.stat(log.path)
+        except FileNotFoundError:
+            if log.inode is not None:
+                log.reset(None)
+            return
+        if st.st_ino != log.inode or st.st_size < log.offset:
+            log.reset(st.st_ino)
+        if st.st_size == log.offset:
+            return
+
+        with open(log.path, "rb") as f:
+            f.seek(log.offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1       # a torn last line waits for its end
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            roll = entry["r"]
+            if "s" in entry:
+                log.answers[roll] = bytearray.fromhex(entry["s"])
+            else:
+                _apply(log.answers.setdefault(roll, bytearray()), entry["d"])
+                log.deltas += 1
+            log.saved_at[roll] = entry["t"]
+        log.offset += end
+
+    def _read(self, exam_id, fn):
+        log = self._log(exam_id)
+        with log.lock:
+            fd = self._flock(log, fcntl.LOCK_SH)
+            try:
+                self._refresh(log)
+            finally:
+                self._unlock(fd)
+            return fn(log)
+
+    # ---------- writing ----------
+    def record(self, exam_id, roll, delta, n):
+        # delta → [(position, 0-4)]; n → questions in the answer key
+        delta = [(i, v) for i, v in delta if 0 <= i < n and 0 <= v <= 4]
+        if not delta:
+            return 0
+
+        log = self._log(exam_id)
+        line = json.dumps({"r": roll, "d": delta, "t": time.time()}, separators=(",", ":"))
+        with log.lock:
+            fd = self._flock(log, fcntl.LOCK_SH)
+            try:
+                # O_APPEND + one write per line → lines from several
+                # workers never interleave
+                out = os.open(log.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                try:
+                    os.write(out, (line + "\n").encode())
+                    if self.durable:
+                        os.fsync(out)
+                finally:
+                    os.close(out)
+                self._refresh(log)
+            finally:
+                self._unlock(fd)
+            if log.deltas >= self.compact_every:
+                self._compact(log)
+        return len(delta)
+
+    def _compact(self, log):
+        # Caller holds log.lock; other workers wait on the exclusive flock
+        fd = self._flock(log, fcntl.LOCK_EX)
+        try:
+            self._refresh(log)
+            if log.deltas < self.compact_every:
+                return                        # another worker just did it
+            tmp = f"{log.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for roll, answers in log.answers.items():
+                    f.write(json.dumps({"r": roll, "s": answers.hex(), "t": log.saved_at.get(roll, 0)},
+                                       separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, log.path)
+            st = os.stat(log.path)
+            log.inode, log.offset, log.deltas = st.st_ino, st.st_size, 0
+        finally:
+            self._unlock(fd)
+
+    # ---------- reading ----------
+    def answers(self, exam_id, roll, n):
+        # → copy of the saved answers padded / trimmed to n, or None
+        def get(log):
+            answers = log.answers.get(roll)
+            if answers is None:
+                return None
+            return (bytes(answers) + bytes(n))[:n]
+        return self._read(exam_id, get)
+
+    def students(self, exam_id):
+        # → [(roll, answers, saved_at)] for every student with a checkpoint
+        return self._read(exam_id, lambda log: [
+            (roll, bytes(a), log.saved_at.get(roll)) for roll, a in log.answers.items()
+        ])
+
+    def drop(self, exam_id):
+        with self._lock:
+            self._logs.pop(exam_id, None)
+        for path in glob.glob(self.path(exam_id) + "*"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _apply(answers, delta):
+    for i, v in delta:
+        if i >= len(answers):
+            answers.extend(bytes(i + 1 - len(answers)))
+        answers[i] = v
@@ -0,0 +1,223 @@
+import base64, hashlib, hmac, os, secrets, sqlite3, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+
+# =========================
+# PASSWORD HASHES
+# =========================
+# Stored as "<kdf>$<cost>$<salt>$<digest>" (base64, no padding):
+#   scrypt         → cost = log2(N), r=8, p=1
+#   pbkdf2_sha256  → cost = iterations
+# Anything else in a password column is a legacy plaintext password; it
+# still logs in, and is replaced by a hash on the first successful login.
+# Both KDFs run in OpenSSL with the GIL released, so hashing threads use
+# every core.
+SALT_BYTES = 16
+DEFAULT_KDF = "scrypt"
+DEFAULT_COST = {"scrypt": 14, "pbkdf2_sha256": 200000}
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, cost):
+    n = 1 << cost
+    return hashlib.scrypt(password, salt=salt, n=n, r=8, p=1, maxmem=256 * 8 * n + (1 << 20))
+
+
+def _pbkdf2_sha256(password, salt, cost):
+    return hashlib.pbkdf2_hmac("sha256", password, salt, cost)
+
+
+KDFS = {"scrypt": _scrypt, "pbkdf2_sha256": _pbkdf2_sha256}
+
+
+def hash_password(password, kdf=DEFAULT_KDF, cost=None):
+    cost = cost or DEFAULT_COST[kdf]
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = KDFS[kdf](password.encode(), salt, cost)
+    return f"{kdf}${cost}${_b64(salt)}${_b64(digest)}"
+
+
+def parse_hash(stored):
+    # → (kdf, cost, salt, digest), or None for a plaintext password
+    parts = (stored or "").split("$")
+    if len(parts) != 4 or parts[0] not in KDFS:
+        return None
+    try:
+        return parts[0], int(parts[1]), _unb64(parts[2]), _unb64(parts[3])
+    except ValueError:
+        return None
+
+
+def check_password(stored, password):
+    parsed = parse_hash(stored)
+    if parsed is None:
+        # legacy plaintext row
+        return stored is not None and hmac.compare_digest(stored.encode(), password.encode())
+    kdf, cost, salt, digest = parsed
+    return hmac.compare_digest(KDFS[kdf](password.encode(), salt, cost), digest)
+
+
+def needs_rehash(stored, kdf=DEFAULT_KDF, cost=None):
+    parsed = parse_hash(stored)
+    return parsed is None or parsed[:2] != (kdf, cost or DEFAULT_COST[kdf])
+
+
+# =========================
+# HASHER (BOUNDED POOL)
+# =========================
+# Logins hash on `workers` threads (default: one per CPU), so a login
+# storm at exam start queues for CPU instead of piling onto it; at most
+# `max_pending` logins wait, the rest get Busy after `wait` seconds.
+class Busy(Exception):
+    pass
+
+
+class Hasher:
+
+    def __init__(self, kdf=DEFAULT_KDF, cost=None, workers=None, max_pending=None, wait=10):
+        if kdf not in KDFS:
+            raise ValueError(f"unknown password KDF {kdf!r} (use {', '.join(KDFS)})")
+        self.kdf = kdf
+        self.cost = cost or DEFAULT_COST[kdf]
+        self.workers = workers or os.cpu_count() or 1
+        self.wait = wait
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="password-hasher")
+        self._slots = threading.BoundedSemaphore(max_pending or self.workers * 32)
+        # unknown users are checked against this → same time as a wrong password
+        self._dummy = hash_password(secrets.token_hex(8), self.kdf, self.cost)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.wait):
+            raise Busy()
+        try:
+            return self._pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.kdf, self.cost)
+
+    def verify(self, stored, password):
+        # → (ok, new hash to store or None)
+        if stored is None:
+            self._run(check_password, self._dummy, password)
+            return False, None
+        if not self._run(check_password, stored, password):
+            return False, None
+        if needs_rehash(stored, self.kdf, self.cost):
+            return True, self.hash(password)
+        return True, None
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+# =========================
+# BATCH MIGRATION
+# =========================
+# Every plaintext (or outdated) password → hash, all tables, hashed in
+# parallel and written in one transaction per table. Empty student
+# passwords get the default '1234' first.
+PASSWORD_TABLES = (("admin", "username"), ("faculty", "emp_id"), ("students", "roll"))
+DEFAULT_STUDENT_PASSWORD = "1234"
+
+
+def migrate_passwords(con, kdf=DEFAULT_KDF, cost=None, workers=None):
+    cost = cost or DEFAULT_COST[kdf]
+    con.execute(
+        "UPDATE students SET password=? WHERE password IS NULL OR password=''",
+        (DEFAULT_STUDENT_PASSWORD,)
+    )
+    con.commit()
+
+    report = {}
+    with ThreadPoolExecutor(workers or os.cpu_count() or 1) as pool:
+        for table, key in PASSWORD_TABLES:
+            rows = [(r[0], r[1]) for r in con.execute(f"SELECT {key}, password FROM {table}")
+                    if r[1] is not None and needs_rehash(r[1], kdf, cost)]
+            started = time.perf_counter()
+            hashes = pool.map(lambda row: _rehash(row[1], kdf, cost), rows)
+            try:
+                # `password=?` → a row changed meanwhile (e.g. a login) is left alone
+                con.executemany(
+                    f"UPDATE {table} SET password=? WHERE {key}=? AND password=?",
+                    ((new, k, old) for (k, old), new in zip(rows, hashes) if new)
+                )
+                con.commit()
+            except Exception:
+                con.rollback()
+                raise
+            report[table] = (len(rows), time.perf_counter() - started)
+    return report
+
+
+def _rehash(stored, kdf, cost):
+    # Outdated hashes can't be re-derived without the password; they are
+    # upgraded on the next login instead
+    return hash_password(stored, kdf, cost) if parse_hash(stored) is None else None
+
+
+# =========================
+# LOGIN BENCHMARK
+# =========================
+# Time of one login check and throughput of `logins` concurrent checks
+# through the Hasher, per KDF / cost → pick the highest cost at which an
+# exam-start storm of `logins` students still clears quickly enough.
+def bench(settings, logins=200, workers=None):
+    results = []
+    for kdf, cost in settings:
+        stored = hash_password("correct horse", kdf, cost)
+        started = time.perf_counter()
+        check_password(stored, "correct horse")
+        single = time.perf_counter() - started
+
+        hasher = Hasher(kdf, cost, workers, max_pending=logins)
+        threads = [threading.Thread(target=hasher.verify, args=(stored, "correct horse"))
+                   for _ in range(logins)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        storm = time.perf_counter() - started
+        hasher.shutdown()
+        results.append((kdf, cost, single, storm, logins / storm))
+    return results
+
+
+# =========================
+# CLI
+# =========================
+#   python credentials.py migrate [database.db]  → hash every plaintext password
+#   python credentials.py bench [logins]         → login cost per KDF / cost
+#   PASSWORD_KDF / PASSWORD_COST / HASH_WORKERS as for the app
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("migrate", "bench"):
+        print("usage: python credentials.py migrate [database.db] | bench [logins]")
+        sys.exit(1)
+
+    kdf = os.getenv("PASSWORD_KDF", DEFAULT_KDF)
+    cost = int(os.getenv("PASSWORD_COST", "0")) or None
+    workers = int(os.getenv("HASH_WORKERS", "0")) or None
+
+    if sys.argv[1] == "migrate":
+        con = sqlite3.connect(sys.argv[2] if len(sys.argv) > 2 else "database.db", timeout=30)
+        for table, (n, seconds) in migrate_passwords(con, kdf, cost, workers).items():
+            print(f"✅ {table}: {n} passwords hashed in {seconds:.1f} s")
+        con.close()
+    else:
+        logins = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+        settings = [(kdf, cost)] if os.getenv("PASSWORD_KDF") else [
+            ("scrypt", 13), ("scrypt", 14), ("scrypt", 15),
+            ("pbkdf2_sha256", 100000), ("pbkdf2_sha256", 200000), ("pbkdf2_sha256", 600000),
+        ]
+        for kdf, cost, single, storm, rate in bench(settings, logins, workers):
+            print(f"{kdf:>14} cost {cost:>6}: {single * 1000:7.1f} ms/login  "
+                  f"{logins} concurrent in {storm:5.2f} s ({rate:6.1f} logins/s)")
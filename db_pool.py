@@ -0,0 +1,219 @@
+import sqlite3, threading, time
+from queue import LifoQueue, Empty
+
+from flask import g, has_app_context
+
+
+# =========================
+# POOLED CONNECTION
+# =========================
+class PooledConnection:
+    # Thin wrapper so existing `con.close()` calls hand the connection
+    # back to the pool instead of closing the underlying sqlite handle.
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self._raw.__enter__()
+
+    def __exit__(self, *exc):
+        return self._raw.__exit__(*exc)
+
+    def execute(self, sql, params=()):
+        return self._raw.execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self._raw.executemany(sql, seq)
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        self._pool.release(self._raw)
+
+
+# =========================
+# CONNECTION POOL
+# =========================
+class ConnectionPool:
+
+    def __init__(self, path, max_size=32, timeout=30, wait_timeout=30, on_open=()):
+        self.path = path
+        self.on_open = list(on_open)      # fn(raw connection) per new connection
+        self.max_size = max_size
+        self.timeout = timeout
+        self.wait_timeout = wait_timeout
+
+        self._idle = LifoQueue()
+        self._lock = threading.Lock()
+        self._size = 0
+        self._stats = {
+            "opened": 0,
+            "checkouts": 0,
+            "reused": 0,
+            "waits": 0,
+            "wait_ms": 0.0,
+            "reconnects": 0,
+            "released": 0,
+        }
+
+    # ---------- connection setup (pragmas run ONCE per connection) ----------
+    def _open(self):
+        con = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            check_same_thread=False
+        )
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL;")
+        con.execute("PRAGMA synchronous=NORMAL;")
+        for fn in self.on_open:
+            fn(con)
+        self._count("opened")
+        return con
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    def _healthy(self, con):
+        try:
+            con.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    # ---------- checkout / release ----------
+    def _checkout(self):
+        con = None
+        try:
+            con = self._idle.get_nowait()
+        except Empty:
+            with self._lock:
+                can_open = self._size < self.max_size
+                if can_open:
+                    self._size += 1
+            if can_open:
+                try:
+                    con = self._open()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                    raise
+            else:
+                started = time.perf_counter()
+                try:
+                    con = self._idle.get(timeout=self.wait_timeout)
+                except Empty:
+                    raise sqlite3.OperationalError("connection pool exhausted")
+                with self._lock:
+                    self._stats["waits"] += 1
+                    self._stats["wait_ms"] += (time.perf_counter() - started) * 1000
+        else:
+            self._count("reused")
+
+        # Health check on checkout → reopen broken handles
+        if not self._healthy(con):
+            try:
+                con.close()
+            except sqlite3.Error:
+                pass
+            con = self._open()
+            self._count("reconnects")
+
+        self._count("checkouts")
+        return con
+
+    def release(self, con):
+        # Never hand a half-finished transaction to the next request
+        try:
+            if con.in_transaction:
+                con.rollback()
+        except sqlite3.Error:
+            try:
+                con.close()
+            except sqlite3.Error:
+                pass
+            with self._lock:
+                self._size -= 1
+            return
+        self._count("released")
+        self._idle.put(con)
+
+    def connection(self):
+        # Inside a request → one connection per app context, reused by
+        # every db() call and returned by teardown_appcontext.
+        if has_app_context():
+            pooled = g.get("_db_con")
+            if pooled is None or pooled._released:
+                pooled = PooledConnection(self, self._checkout())
+                g._db_con = pooled
+            return _RequestHandle(pooled)
+
+        return PooledConnection(self, self._checkout())
+
+    def dedicated(self):
+        # Own connection even inside a request: commits here never carry
+        # the request's unfinished writes (e.g. session saves)
+        return PooledConnection(self, self._checkout())
+
+    def teardown(self, exc=None):
+        pooled = g.pop("_db_con", None)
+        if pooled is not None:
+            pooled.close()
+
+    def init_app(self, app):
+        app.teardown_appcontext(self.teardown)
+
+    def close_all(self):
+        while True:
+            try:
+                con = self._idle.get_nowait()
+            except Empty:
+                break
+            con.close()
+            with self._lock:
+                self._size -= 1
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["size"] = self._size
+        data["idle"] = self._idle.qsize()
+        data["in_use"] = data["size"] - data["idle"]
+        data["max_size"] = self.max_size
+        data["wait_ms"] = round(data["wait_ms"], 2)
+        return data
+
+
+class _RequestHandle:
+    # Routes call con.close() as soon as they are done; within a request
+    # that must not return the shared connection early, so close() is a
+    # no-op here and teardown_appcontext performs the real release.
+
+    def __init__(self, pooled):
+        self._pooled = pooled
+
+    def __getattr__(self, name):
+        return getattr(self._pooled, name)
+
+    def __enter__(self):
+        return self._pooled.__enter__()
+
+    def __exit__(self, *exc):
+        return self._pooled.__exit__(*exc)
+
+    def execute(self, sql, params=()):
+        return self._pooled.execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self._pooled.executemany(sql, seq)
+
+    def close(self):
+        pass
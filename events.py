@@ -0,0 +1,104 @@
+import json, threading
+from queue import Queue, Full, Empty
+
+
+# =========================
+# EXAM EVENTS (IN-PROCESS PUB/SUB)
+# =========================
+# The submission path publishes one event per committed submission; every
+# faculty monitor stream subscribed to that exam receives it. Counters are
+# kept in memory so streams never query the database after connecting.
+class ExamEvents:
+
+    def __init__(self, queue_size=256):
+        self.queue_size = queue_size
+        self._subs = {}           # exam_id → set of queues
+        self._counters = {}       # exam_id → {"total", "submitted"}
+        self._lock = threading.Lock()
+
+    # ---------- counters ----------
+    def counters(self, exam_id, loader):
+        # loader() → (total, submitted); called once per exam per process
+        with self._lock:
+            c = self._counters.get(exam_id)
+        if c is None:
+            total, submitted = loader()
+            with self._lock:
+                c = self._counters.setdefault(exam_id, {"total": total, "submitted": submitted})
+        return self._snapshot(c)
+
+    @staticmethod
+    def _snapshot(c):
+        return {
+            "total": c["total"],
+            "submitted": c["submitted"],
+            "writing": max(c["total"] - c["submitted"], 0),
+        }
+
+    def forget(self, exam_id):
+        with self._lock:
+            self._counters.pop(exam_id, None)
+
+    # ---------- pub/sub ----------
+    def subscribe(self, exam_id):
+        q = Queue(self.queue_size)
+        with self._lock:
+            self._subs.setdefault(exam_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, exam_id, q):
+        with self._lock:
+            subs = self._subs.get(exam_id)
+            if subs is not None:
+                subs.discard(q)
+                if not subs:
+                    del self._subs[exam_id]
+
+    def publish(self, exam_id, event):
+        with self._lock:
+            subs = list(self._subs.get(exam_id, ()))
+        for q in subs:
+            try:
+                q.put_nowait(event)
+            except Full:
+                # Slow client → it reloads from the page instead
+                pass
+
+    def submitted(self, exam_id, roll, marks):
+        with self._lock:
+            c = self._counters.get(exam_id)
+            if c is not None:
+                c["submitted"] += 1
+                counts = self._snapshot(c)
+            else:
+                counts = None
+
+        event = {"type": "submitted", "roll": roll, "marks": marks}
+        if counts:
+            event.update(counts)
+        self.publish(exam_id, event)
+
+    def watchers(self, exam_id):
+        with self._lock:
+            return len(self._subs.get(exam_id, ()))
+
+
+# =========================
+# SERVER-SENT EVENTS
+# =========================
+def sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def stream(events, exam_id, first, heartbeat=15):
+    q = events.subscribe(exam_id)
+    try:
+        yield sse(first)
+        while True:
+            try:
+                yield sse(q.get(timeout=heartbeat))
+            except Empty:
+                # keeps proxies from closing an idle connection
+                yield ": ping\n\n"
+    finally:
+        events.unsubscribe(exam_id, q)
@@ -0,0 +1,66 @@
+import csv, io, tempfile
+from openpyxl import Workbook
+
+
+# =========================
+# STREAMING EXPORTS
+# =========================
+# Rows are pulled from the cursor FETCH_SIZE at a time and written out as
+# they arrive, so an export never holds the whole result set (or a
+# DataFrame copy of it) in memory.
+FETCH_SIZE = 1000
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def iter_rows(con, sql, params=(), size=FETCH_SIZE):
+    cur = con.execute(sql, params)
+    try:
+        while True:
+            rows = cur.fetchmany(size)
+            if not rows:
+                return
+            for row in rows:
+                yield tuple(row)
+    finally:
+        cur.close()
+
+
+# ---------- CSV: first bytes go out with the first chunk ----------
+def stream_csv(header, rows, chunk_rows=FETCH_SIZE):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    # BOM so Excel opens the file as UTF-8
+    buf.write("\ufeff")
+    writer.writerow(header)
+
+    n = 0
+    for row in rows:
+        writer.writerow(row)
+        n += 1
+        if n % chunk_rows == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+# ---------- XLSX: openpyxl write-only → temp file ----------
+# Write-only worksheets stream rows to disk instead of keeping cells in
+# memory; the zip container is assembled on save into an anonymous temp
+# file, which disappears as soon as the response closes it.
+def write_xlsx(header, rows, title="Results"):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+
+    out = tempfile.TemporaryFile(suffix=".xlsx")
+    try:
+        wb.save(out)
+    except Exception:
+        out.close()
+        raise
+    out.seek(0)
+    return out
@@ -0,0 +1,217 @@
+import sqlite3, sys, threading, time
+from array import array
+
+import numpy as np
+
+import stats
+
+
+# =========================
+# COMPILED ANSWER KEYS
+# =========================
+# One AnswerKey per exam, built when the exam starts. `correct` holds the
+# option index (0-3 → a-d) per question in question-id order, -1 when the
+# question has no usable answer. Grading never touches the database. Each
+# key remembers the exams.revision it was compiled from; a question upload
+# or a re-grade in any worker bumps it, and answer_key() then recompiles.
+OPTIONS = ("a", "b", "c", "d")
+OPTION_INDEX = {o: i for i, o in enumerate(OPTIONS)}
+
+
+class AnswerKey:
+    __slots__ = ("exam_id", "revision", "qids", "correct", "slots")
+
+    def __init__(self, exam_id, qids, correct, revision=None):
+        self.exam_id = exam_id
+        self.revision = revision
+        self.qids = array("q", qids)
+        self.correct = array("b", correct)
+        # form field name (question id as text) → position in the key
+        self.slots = {str(q): i for i, q in enumerate(qids)}
+
+    def __len__(self):
+        return len(self.qids)
+
+
+def correct_index(q):
+    # `correct` may be the option letter or the option text itself
+    correct = (q["correct"] or "").strip().lower()
+    if not correct:
+        return -1
+    if correct in OPTION_INDEX:
+        return OPTION_INDEX[correct]
+    for i, opt in enumerate(OPTIONS):
+        if q[opt] and q[opt].strip().lower() == correct:
+            return i
+    return -1
+
+
+KEY_REVISION_SQL = "SELECT revision FROM exams WHERE id=?"
+
+
+def compile_answer_key(con, exam_id):
+    # Revision first: questions newer than it only cause one more rebuild
+    row = con.execute(KEY_REVISION_SQL, (exam_id,)).fetchone()
+    rows = con.execute(
+        "SELECT id, a, b, c, d, correct FROM questions WHERE exam_id=? ORDER BY id",
+        (exam_id,)
+    ).fetchall()
+    return AnswerKey(exam_id, [r["id"] for r in rows], [correct_index(r) for r in rows],
+                     row[0] if row else None)
+
+
+_keys = {}
+_keys_lock = threading.Lock()
+
+
+def build_answer_key(con, exam_id):
+    key = compile_answer_key(con, exam_id)
+    with _keys_lock:
+        _keys[exam_id] = key
+    return key
+
+
+def answer_key(con, exam_id, revision=None):
+    # revision → the caller already read it (e.g. payload.revision)
+    key = _keys.get(exam_id)
+    if key is not None:
+        if revision is None:
+            row = con.execute(KEY_REVISION_SQL, (exam_id,)).fetchone()
+            revision = row[0] if row else None
+        if key.revision == revision:
+            return key
+    # e.g. after a restart while the exam is ACTIVE, or a new revision
+    return build_answer_key(con, exam_id)
+
+
+def invalidate_answer_key(exam_id):
+    with _keys_lock:
+        _keys.pop(exam_id, None)
+
+
+# =========================
+# GRADING
+# =========================
+# Submitted answers are kept as one byte per question in key order:
+# 0 = unanswered, 1-4 = a-d. That blob is what `responses` stores and what
+# regrade_exam() scores again later. With a per-student shuffle (see
+# shuffling.py) the submitted letter is the one the student saw; it is
+# mapped back to the real option here, so the blob is always in key order.
+def encode_changes(key, changes, shuffle=None):
+    # {question id: shown letter} → [(position, 0-4)]; "" clears an answer
+    delta = []
+    for name, ans in changes.items():
+        i = key.slots.get(name)
+        if i is None:
+            continue
+        ans = (ans or "").strip().lower()
+        if not ans:
+            delta.append((i, 0))
+            continue
+        opt = OPTION_INDEX.get(ans)
+        if opt is not None:
+            if shuffle is not None:
+                opt = shuffle.real_option(i, opt)
+            delta.append((i, opt + 1))
+    return delta
+
+
+def encode_answers(key, form, shuffle=None, base=None):
+    # base → answers already checkpointed; the form only adds to them
+    answers = bytearray(base) if base is not None else bytearray(len(key))
+    for i, v in encode_changes(key, form, shuffle):
+        if v:
+            answers[i] = v
+    return answers
+
+
+def score_answers(key, answers):
+    score = 0
+    for a, c in zip(answers, key.correct):
+        if c >= 0 and a == c + 1:
+            score += 1
+    return score
+
+
+def grade(key, form, shuffle=None, base=None):
+    answers = encode_answers(key, form, shuffle, base)
+    return score_answers(key, answers), bytes(answers)
+
+
+# =========================
+# BATCH RE-GRADING
+# =========================
+REGRADE_SQL = (
+    "SELECT r.roll, r.marks, p.answers FROM responses p "
+    "JOIN results r ON r.roll = p.roll AND r.exam_id = p.exam_id "
+    "WHERE p.exam_id=?"
+)
+
+
+def regrade_exam(con, exam_id):
+    started = time.perf_counter()
+
+    # Recompile → picks up any corrected `correct` values; the new
+    # revision makes every other worker recompile too
+    con.execute("UPDATE exams SET revision = revision + 1 WHERE id=?", (exam_id,))
+    key = build_answer_key(con, exam_id)
+    n = len(key)
+
+    rows = con.execute(REGRADE_SQL, (exam_id,)).fetchall()
+
+    if not rows or n == 0:
+        con.commit()
+        return {"exam_id": exam_id, "students": len(rows), "changed": 0, "ms": 0.0}
+
+    blobs = [r["answers"] for r in rows]
+    if all(len(b) == n for b in blobs):
+        matrix = np.frombuffer(b"".join(blobs), dtype=np.uint8).reshape(len(blobs), n)
+    else:
+        # Questions were appended after some submissions → pad / trim
+        matrix = np.zeros((len(blobs), n), dtype=np.uint8)
+        for i, b in enumerate(blobs):
+            row = np.frombuffer(b, dtype=np.uint8)[:n]
+            matrix[i, :len(row)] = row
+
+    correct = np.frombuffer(key.correct, dtype=np.int8).astype(np.int16) + 1
+    valid = correct > 0
+    scores = ((matrix == correct) & valid).sum(axis=1)
+
+    old = np.fromiter((r["marks"] or 0 for r in rows), dtype=np.int64, count=len(rows))
+    changed = np.nonzero(scores != old)[0]
+
+    try:
+        con.executemany(
+            "UPDATE results SET marks=? WHERE roll=? AND exam_id=?",
+            ((int(scores[i]), rows[i]["roll"], exam_id) for i in changed)
+        )
+        if len(changed):
+            stats.marks_changed(con, exam_id)
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+
+    return {
+        "exam_id": exam_id,
+        "students": len(rows),
+        "changed": len(changed),
+        "ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+# =========================
+# CLI
+# =========================
+#   python grading.py regrade <exam_id> [database.db]
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "regrade":
+        print("usage: python grading.py regrade <exam_id> [database.db]")
+        sys.exit(1)
+
+    con = sqlite3.connect(sys.argv[3] if len(sys.argv) > 3 else "database.db", timeout=30)
+    con.row_factory = sqlite3.Row
+    report = regrade_exam(con, int(sys.argv[2]))
+    con.close()
+    print(f"✅ Exam {report['exam_id']}: {report['students']} re-graded, "
+          f"{report['changed']} marks changed in {report['ms']} ms")
@@ -0,0 +1,258 @@
+import csv, io, time
+import pandas as pd
+from openpyxl import load_workbook
+
+import stats
+
+
+# =========================
+# CHUNKED UPLOAD READER
+# =========================
+# Yields DataFrames of at most `chunk_size` rows. The frame index is the
+# 0-based data row in the sheet, so row numbers stay right across chunks.
+CHUNK_SIZE = 1000
+
+
+def _frame(header, rows, start):
+    return pd.DataFrame(rows, columns=header, index=range(start, start + len(rows)))
+
+
+def _iter_csv(stream, chunk_size):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        return
+
+    start, rows = 0, []
+    for row in reader:
+        if not any(row):
+            continue
+        rows.append(row[:len(header)] + [None] * (len(header) - len(row)))
+        if len(rows) == chunk_size:
+            yield _frame(header, rows, start)
+            start, rows = start + len(rows), []
+    if rows:
+        yield _frame(header, rows, start)
+    text.detach()
+
+
+def _iter_xlsx(stream, chunk_size):
+    # read_only → rows are parsed lazily from the sheet XML
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows_iter = wb.active.iter_rows(values_only=True)
+        header = next(rows_iter, None)
+        if header is None:
+            return
+        header = [h if h is not None else "" for h in header]
+
+        start, rows = 0, []
+        for row in rows_iter:
+            if all(v is None for v in row):
+                continue
+            rows.append(row[:len(header)])
+            if len(rows) == chunk_size:
+                yield _frame(header, rows, start)
+                start, rows = start + len(rows), []
+        if rows:
+            yield _frame(header, rows, start)
+    finally:
+        wb.close()
+
+
+def iter_chunks(file, chunk_size=CHUNK_SIZE):
+    name = (getattr(file, "filename", "") or "").lower()
+    stream = getattr(file, "stream", file)
+
+    if name.endswith(".csv"):
+        yield from _iter_csv(stream, chunk_size)
+    elif name.endswith(".xls"):
+        # Legacy binary workbooks cannot be streamed → slice the full frame
+        df = pd.read_excel(stream)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    else:
+        yield from _iter_xlsx(stream, chunk_size)
+
+
+def _normalize_columns(df):
+    return df.rename(columns=lambda c: str(c).strip().lower())
+
+
+# =========================
+# STUDENT IMPORT
+# =========================
+STUDENT_COLUMNS = ["roll", "name", "parent"]
+
+# 10 digit local number, or full international form (+91XXXXXXXXXX)
+PHONE_PATTERN = r"\+\d{10,15}|\d{10}"
+
+
+def _as_text(col):
+    # Excel hands numeric cells back as int/float → "21001", not "21001.0"
+    if pd.api.types.is_float_dtype(col) and (col.dropna() % 1 == 0).all():
+        col = col.astype("Int64")
+    return col.astype("string").fillna("").str.strip()
+
+
+def _existing_rolls(con, rolls):
+    found = set()
+    rolls = list(rolls)
+    for i in range(0, len(rolls), 500):
+        part = rolls[i:i + 500]
+        marks = ",".join("?" * len(part))
+        found.update(
+            r[0] for r in con.execute(
+                f"SELECT roll FROM students WHERE roll IN ({marks})", part
+            )
+        )
+    return found
+
+
+# Vectorized checks → (clean frame, error list). Rows with any error are
+# dropped from the frame and reported with their sheet row number.
+# `seen` carries roll numbers from earlier chunks of the same upload.
+def validate_students(con, df, seen=None):
+    df = _normalize_columns(df)
+    seen = seen if seen is not None else set()
+
+    missing = [c for c in STUDENT_COLUMNS if c not in df.columns]
+    if missing:
+        return None, [{"row": 1, "roll": "", "error": "Missing column(s): " + ", ".join(missing)}]
+
+    data = pd.DataFrame({
+        "row": df.index + 2,                      # +1 header, +1 one-based
+        "roll": _as_text(df["roll"]),
+        "name": _as_text(df["name"]),
+        "parent": _as_text(df["parent"]).str.replace(r"[\s-]", "", regex=True),
+    })
+
+    duplicate = (data["roll"] != "") & (
+        data["roll"].duplicated(keep="first") | data["roll"].isin(seen)
+    )
+    exists = ~duplicate & data["roll"].isin(_existing_rolls(con, data["roll"].unique()))
+
+    checks = [
+        (data["roll"] == "", "Roll number is empty"),
+        (data["name"] == "", "Name is empty"),
+        (duplicate, "Duplicate roll number in sheet"),
+        (exists, "Roll number already exists"),
+        (~data["parent"].str.fullmatch(PHONE_PATTERN).fillna(False).astype(bool),
+         "Invalid parent phone number"),
+    ]
+
+    bad = pd.Series(False, index=data.index)
+    reasons = pd.Series("", index=data.index)
+    for mask, msg in checks:
+        mask = mask.astype(bool)
+        reasons[mask] = reasons[mask] + ("; " + msg)
+        bad |= mask
+
+    seen.update(data["roll"][data["roll"] != ""])
+
+    errors = [
+        {"row": int(r), "roll": roll, "error": why.lstrip("; ")}
+        for r, roll, why in zip(data["row"][bad], data["roll"][bad], reasons[bad])
+    ]
+    return data[~bad], errors
+
+
+# Every chunk is validated and written as soon as it is read; the whole
+# upload still commits (or rolls back) as one transaction. Any invalid
+# row rolls the whole upload back: the class is then still empty, so the
+# corrected file can be uploaded again.
+def import_students(con, chunks, year, branch, section):
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+
+    report = {"total": 0, "inserted": 0, "errors": [], "db_ms": 0.0}
+    seen = set()
+    db_time = 0.0
+
+    try:
+        for df in chunks:
+            report["total"] += len(df)
+            clean, errors = validate_students(con, df, seen)
+            report["errors"].extend(errors)
+            if clean is None:
+                break
+            if clean.empty:
+                continue
+
+            n = len(clean)
+            rows = zip(
+                clean["roll"], clean["name"], clean["parent"],
+                [year] * n, [branch] * n, [section] * n
+            )
+
+            started = time.perf_counter()
+            con.executemany("""
+                INSERT INTO students
+                (roll, name, parent, year, branch, section)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, rows)
+            db_time += time.perf_counter() - started
+            report["inserted"] += n
+
+        if report["errors"]:
+            con.rollback()
+            report["inserted"] = 0
+            return report
+
+        # Exams already created for this class count the new students
+        stats.enrolled_changed(con, year, branch, section, report["inserted"])
+
+        started = time.perf_counter()
+        con.commit()
+        db_time += time.perf_counter() - started
+    except Exception:
+        con.rollback()
+        raise
+
+    report["db_ms"] = round(db_time * 1000, 2)
+    return report
+
+
+# =========================
+# QUESTION IMPORT
+# =========================
+QUESTION_COLUMNS = ["question", "a", "b", "c", "d", "correct"]
+
+
+def import_questions(con, chunks, exam_id):
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+
+    report = {"total": 0, "inserted": 0, "errors": []}
+
+    try:
+        for df in chunks:
+            df = _normalize_columns(df)
+            report["total"] += len(df)
+
+            missing = [c for c in QUESTION_COLUMNS if c not in df.columns]
+            if missing:
+                report["errors"].append({"row": 1, "error": "Missing column(s): " + ", ".join(missing)})
+                break
+
+            cols = {c: _as_text(df[c]) for c in QUESTION_COLUMNS}
+            empty = cols["question"] == ""
+            for r in (df.index[empty.to_numpy()] + 2):
+                report["errors"].append({"row": int(r), "error": "Question is empty"})
+
+            keep = ~empty
+            n = int(keep.sum())
+            con.executemany("""
+                INSERT INTO questions
+                (exam_id, question, a, b, c, d, correct)
+                VALUES (?,?,?,?,?,?,?)
+            """, zip([exam_id] * n, *(cols[c][keep] for c in QUESTION_COLUMNS)))
+            report["inserted"] += n
+
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+
+    return report
@@ -0,0 +1,466 @@
+import re, sqlite3, sys
+import grading, papers, payloads, queries, scheduler, sessions, sms, stats
+from pagination import keyset_sql
+from papers import register_functions
+
+
+# =========================
+# SCHEMA MIGRATIONS
+# =========================
+# Each migration is (version, name, steps). A step is either a SQL string
+# or a callable taking the connection. Versions are applied in order, each
+# inside its own transaction, and recorded in schema_migrations.
+
+def _add_attended_on(con):
+    cols = [r[1] for r in con.execute("PRAGMA table_info(attendance)")]
+    if "attended_on" not in cols:
+        con.execute("ALTER TABLE attendance ADD COLUMN attended_on TEXT")
+
+
+def _backfill_exam_stats(con):
+    stats.rebuild(con)
+
+
+def _archive_exam_papers(con):
+    # Row-per-question copies → header + content-addressed bodies
+    register_functions(con)
+    con.execute("""
+        INSERT OR IGNORE INTO paper_archive
+        (exam_id, year, branch, section, exam_date, questions, archived_at)
+        SELECT exam_id, year, branch, section, exam_date, COUNT(*), DATETIME('now')
+        FROM exam_papers GROUP BY exam_id
+    """)
+    con.execute("""
+        INSERT OR IGNORE INTO paper_bodies (hash, question, a, b, c, d, correct)
+        SELECT paper_hash(question, a, b, c, d, correct), question, a, b, c, d, correct
+        FROM exam_papers
+    """)
+    con.execute("""
+        INSERT OR IGNORE INTO paper_questions (exam_id, position, hash)
+        SELECT exam_id,
+               ROW_NUMBER() OVER (PARTITION BY exam_id ORDER BY rowid),
+               paper_hash(question, a, b, c, d, correct)
+        FROM exam_papers
+    """)
+
+
+MIGRATIONS = [
+    (1, "baseline tables", [
+        """CREATE TABLE IF NOT EXISTS admin(
+            username TEXT PRIMARY KEY,
+            password TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS faculty(
+            emp_id TEXT PRIMARY KEY,
+            name TEXT,
+            password TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS students(
+            roll TEXT PRIMARY KEY,
+            name TEXT,
+            parent TEXT,
+            year TEXT,
+            branch TEXT,
+            section TEXT,
+            password TEXT DEFAULT '1234'
+        )""",
+        """CREATE TABLE IF NOT EXISTS exams(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            emp_id TEXT,
+            year TEXT,
+            branch TEXT,
+            section TEXT,
+            duration INTEGER,
+            status TEXT,
+            start_time TEXT,
+            exam_date TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS questions(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            exam_id INTEGER,
+            question TEXT,
+            a TEXT,b TEXT,c TEXT,d TEXT,
+            correct TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS results(
+            roll TEXT,
+            exam_id INTEGER,
+            marks INTEGER,
+            submit_time TEXT,
+            PRIMARY KEY(roll,exam_id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS attendance(
+            exam_id INTEGER,
+            roll TEXT,
+            status TEXT,
+            PRIMARY KEY(exam_id,roll)
+        )""",
+        """CREATE TABLE IF NOT EXISTS exam_papers(
+            exam_id INTEGER,
+            year TEXT,
+            branch TEXT,
+            section TEXT,
+            exam_date TEXT,
+            question TEXT,a TEXT,b TEXT,c TEXT,d TEXT,correct TEXT
+        )""",
+    ]),
+
+    # student_exam writes attendance.attended_on, which the baseline
+    # table never had
+    (2, "attendance.attended_on", [_add_attended_on]),
+
+    (3, "indexes for hot filter paths", [
+        # class roster lookups + COUNT(*) (create_exam, monitor_exam,
+        # student_dashboard, faculty_dashboard subquery)
+        """CREATE INDEX IF NOT EXISTS idx_students_class
+           ON students(year, branch, section, roll, name)""",
+        # active exam lookups per class
+        """CREATE INDEX IF NOT EXISTS idx_exams_status_class
+           ON exams(status, year, branch, section)""",
+        # faculty_results / export_results / end_exam ownership
+        """CREATE INDEX IF NOT EXISTS idx_exams_emp
+           ON exams(emp_id)""",
+        # results by exam (PK leads with roll)
+        """CREATE INDEX IF NOT EXISTS idx_results_exam
+           ON results(exam_id, roll, marks, submit_time)""",
+        """CREATE INDEX IF NOT EXISTS idx_questions_exam
+           ON questions(exam_id)""",
+        """CREATE INDEX IF NOT EXISTS idx_exam_papers_exam
+           ON exam_papers(exam_id)""",
+        """CREATE INDEX IF NOT EXISTS idx_exam_papers_class
+           ON exam_papers(year, branch, section, exam_date, exam_id)""",
+    ]),
+
+    # raw answers, one byte per question (see grading.encode_answers)
+    (4, "responses", [
+        """CREATE TABLE IF NOT EXISTS responses(
+            exam_id INTEGER,
+            roll TEXT,
+            answers BLOB,
+            PRIMARY KEY(exam_id, roll)
+        )""",
+    ]),
+
+    # parent notifications, drained by sms.SmsDispatcher
+    (5, "sms outbox", [
+        """CREATE TABLE IF NOT EXISTS sms_outbox(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            phone TEXT,
+            body TEXT,
+            status TEXT,
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at REAL DEFAULT 0,
+            claimed_by TEXT,
+            claimed_at REAL,
+            provider_id TEXT,
+            last_error TEXT,
+            created_at TEXT,
+            sent_at TEXT
+        )""",
+        """CREATE INDEX IF NOT EXISTS idx_sms_outbox_due
+           ON sms_outbox(status, next_attempt_at)""",
+    ]),
+
+    # bulk result publishing: one batch per exam + completion timestamps
+    (6, "sms outbox batches", [
+        "ALTER TABLE sms_outbox ADD COLUMN batch TEXT",
+        "ALTER TABLE sms_outbox ADD COLUMN finished_at REAL",
+        """CREATE INDEX IF NOT EXISTS idx_sms_outbox_batch
+           ON sms_outbox(batch, status)""",
+    ]),
+
+    # submissions accepted inside the grace period after the deadline
+    (7, "results.late", [
+        "ALTER TABLE results ADD COLUMN late INTEGER DEFAULT 0",
+    ]),
+
+    # per-exam counters maintained by the write paths (see stats.py)
+    (8, "exam stats", [
+        """CREATE TABLE IF NOT EXISTS exam_stats(
+            exam_id INTEGER PRIMARY KEY,
+            enrolled INTEGER DEFAULT 0,
+            submitted INTEGER DEFAULT 0,
+            present INTEGER DEFAULT 0,
+            marks_total INTEGER DEFAULT 0
+        )""",
+        """CREATE INDEX IF NOT EXISTS idx_exams_class
+           ON exams(year, branch, section)""",
+        _backfill_exam_stats,
+    ]),
+
+    # keyset pages of results ordered by (submit_time, roll)
+    (9, "results keyset index", [
+        """CREATE INDEX IF NOT EXISTS idx_results_time
+           ON results(submit_time, roll)""",
+    ]),
+
+    # normalized paper archive (see papers.py) replaces exam_papers
+    (10, "paper archive", [
+        """CREATE TABLE IF NOT EXISTS paper_archive(
+            exam_id INTEGER PRIMARY KEY,
+            year TEXT,
+            branch TEXT,
+            section TEXT,
+            exam_date TEXT,
+            questions INTEGER,
+            archived_at TEXT
+        )""",
+        """CREATE INDEX IF NOT EXISTS idx_paper_archive_class
+           ON paper_archive(year, branch, section, exam_date, exam_id)""",
+        """CREATE TABLE IF NOT EXISTS paper_bodies(
+            hash TEXT PRIMARY KEY,
+            question TEXT,
+            a TEXT, b TEXT, c TEXT, d TEXT,
+            correct TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS paper_questions(
+            exam_id INTEGER,
+            position INTEGER,
+            hash TEXT,
+            PRIMARY KEY(exam_id, position)
+        ) WITHOUT ROWID""",
+        """CREATE INDEX IF NOT EXISTS idx_paper_questions_hash
+           ON paper_questions(hash, exam_id)""",
+        _archive_exam_papers,
+        "DROP TABLE IF EXISTS exam_papers",
+    ]),
+
+    # server-side sessions (see sessions.py)
+    (11, "sessions", [
+        """CREATE TABLE IF NOT EXISTS sessions(
+            sid TEXT PRIMARY KEY,
+            user TEXT,
+            data TEXT,
+            expires REAL
+        )""",
+        """CREATE INDEX IF NOT EXISTS idx_sessions_expires
+           ON sessions(expires)""",
+        """CREATE INDEX IF NOT EXISTS idx_sessions_user
+           ON sessions(user)""",
+    ]),
+
+    # bumped on every question upload → cached exam payloads go stale
+    (12, "exams.revision", [
+        "ALTER TABLE exams ADD COLUMN revision INTEGER DEFAULT 0",
+    ]),
+    # filtered results listings: one ordered walk per exam, merged
+    # (see pagination.MAX_MERGE_ARMS)
+    (13, "results per-exam keyset index", [
+        """CREATE INDEX IF NOT EXISTS idx_results_exam_time
+           ON results(exam_id, submit_time, roll)""",
+    ]),
+    # attendance listing by date: the matching exams, then one PK range each
+    (14, "exams by date index", [
+        """CREATE INDEX IF NOT EXISTS idx_exams_date
+           ON exams(exam_date)""",
+    ]),
+]
+
+
+def current_version(con):
+    con.execute("""CREATE TABLE IF NOT EXISTS schema_migrations(
+        version INTEGER PRIMARY KEY,
+        name TEXT,
+        applied_at TEXT
+    )""")
+    row = con.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    return row[0] or 0
+
+
+def migrate(con):
+    version = current_version(con)
+    con.commit()
+
+    applied = []
+    for number, name, steps in MIGRATIONS:
+        if number <= version:
+            continue
+
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            # Another process may have applied it while we waited
+            if current_version(con) >= number:
+                con.rollback()
+                continue
+
+            for step in steps:
+                if callable(step):
+                    step(con)
+                else:
+                    con.execute(step)
+
+            con.execute(
+                "INSERT INTO schema_migrations(version, name, applied_at) "
+                "VALUES (?,?,DATETIME('now'))",
+                (number, name)
+            )
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+
+        applied.append(number)
+
+    return applied
+
+
+# =========================
+# QUERY PLAN CHECK
+# =========================
+# Route queries that must be answered through an index. Each entry is
+# (label, sql, params, tables allowed to be scanned). The SQL is the
+# constant the code runs (queries.py for the routes, *_SQL in the other
+# modules), so the check cannot drift from it. Allowed scans are for
+# deliberate full listings and for the first page of a keyset listing
+# walking its sort index, never for filtered lookups. SORTED in the
+# allowed tables lets a query sort its rows in a temp b-tree; keyset
+# listings must come out of an index in order.
+SORTED = "ORDER BY"
+_CLASS = ("1", "cse", "a")
+_PAGE = 51
+
+
+def _listing(label, sql, params, keys, cursor, descending=False, allowed=(), arms=1):
+    # First page and a page after `cursor`, as pagination.paginate runs them;
+    # arms=2 → a merged listing (params are one arm's)
+    return [
+        (f"{label}: first page", keyset_sql(sql, keys, descending, cursor=False, arms=arms),
+         (*params,) * arms + (_PAGE,), allowed),
+        (f"{label}: next page", keyset_sql(sql, keys, descending, arms=arms),
+         (*params, *cursor) * arms + (_PAGE,), tuple(t for t in allowed if t == SORTED)),
+    ]
+
+
+_CLASS_FILTER = {alias: queries.class_filter(alias, *_CLASS)[0] for alias in (None, "s", "e")}
+_RESULT_CURSOR = ("2030-01-01 10:00:00", "R1")
+
+HOT_QUERIES = [
+    ("upload_students: class exists", queries.STUDENTS_IN_CLASS, _CLASS, ()),
+    ("create_exam: active exam check", queries.ACTIVE_EXAMS_IN_CLASS, _CLASS, ()),
+    ("create_exam: class roster", queries.CLASS_ROSTER, _CLASS, ()),
+    ("faculty_dashboard: exams with stats", queries.FACULTY_EXAMS, (), ("e",)),
+    ("exam_stats: class exams", stats.ENROLLED_SQL, (1, *_CLASS), ()),
+    ("monitor_exam: exam stats", queries.EXAM_COUNTERS, (1,), ()),
+    ("start_exam: question count", queries.QUESTION_COUNT, (1,), ()),
+    ("monitor_exam: student status", queries.MONITOR_STUDENTS, (1, *_CLASS), ()),
+    ("faculty_results: exams", queries.FACULTY_EXAM_IDS + _CLASS_FILTER["e"], ("F1", *_CLASS), ()),
+    *_listing("faculty_results", queries.FACULTY_RESULTS_OF_EXAM, (1,),
+              queries.RESULT_KEYS, _RESULT_CURSOR, descending=True, arms=2),
+    *_listing("faculty_results by date", queries.FACULTY_RESULTS_OF_EXAM + queries.RESULTS_ON_DATE,
+              (1, "2030-01-01", "2030-01-01"), queries.RESULT_KEYS, _RESULT_CURSOR,
+              descending=True, arms=2),
+    *_listing("faculty_results past MAX_MERGE_ARMS", queries.FACULTY_RESULTS + _CLASS_FILTER["e"],
+              ("F1", *_CLASS), queries.RESULT_KEYS, _RESULT_CURSOR, descending=True,
+              allowed=(SORTED,)),
+    ("faculty_results: total from exam_stats",
+     queries.EXAM_STATS_TOTAL.format(column="submitted", where="e.emp_id = ?" + _CLASS_FILTER["e"]),
+     ("F1", *_CLASS), ()),
+    *_listing("admin_results", queries.ADMIN_RESULTS, (), queries.RESULT_KEYS,
+              _RESULT_CURSOR, descending=True, allowed=("r",)),
+    ("admin_results: class exams", queries.CLASS_EXAMS + _CLASS_FILTER["e"], _CLASS, ()),
+    *_listing("admin_results by class", queries.ADMIN_RESULTS_OF_EXAM, (1,),
+              queries.RESULT_KEYS, _RESULT_CURSOR, descending=True, arms=2),
+    *_listing("admin_results by class and date",
+              queries.ADMIN_RESULTS_OF_EXAM + queries.RESULTS_ON_DATE,
+              (1, "2030-01-01", "2030-01-01"), queries.RESULT_KEYS, _RESULT_CURSOR,
+              descending=True, arms=2),
+    *_listing("admin_results past MAX_MERGE_ARMS", queries.ADMIN_RESULTS + _CLASS_FILTER["e"],
+              _CLASS, queries.RESULT_KEYS, _RESULT_CURSOR, descending=True, allowed=(SORTED,)),
+    *_listing("admin_results by date", queries.ADMIN_RESULTS + queries.RESULTS_ON_DATE,
+              ("2030-01-01", "2030-01-01"), queries.RESULT_KEYS, _RESULT_CURSOR,
+              descending=True),
+    *_listing("admin_view_students", queries.STUDENT_LIST + _CLASS_FILTER[None], _CLASS,
+              queries.STUDENT_KEYS, ("R1",)),
+    *_listing("admin_attendance", queries.ADMIN_ATTENDANCE, (), queries.ATTENDANCE_KEYS,
+              (10, "R1"), descending=True, allowed=("a",)),
+    ("admin_attendance: class exams", queries.CLASS_EXAMS + _CLASS_FILTER["e"], _CLASS, ()),
+    ("admin_attendance: exams on date", queries.CLASS_EXAMS + queries.EXAMS_ON_DATE,
+     ("2030-01-01",), ()),
+    ("admin_attendance: class exams on date",
+     queries.CLASS_EXAMS + _CLASS_FILTER["e"] + queries.EXAMS_ON_DATE, (*_CLASS, "2030-01-01"), ()),
+    ("admin_attendance: total on date from exam_stats",
+     queries.EXAM_STATS_TOTAL.format(column="present", where="1=1" + queries.EXAMS_ON_DATE),
+     ("2030-01-01",), ()),
+    *_listing("admin_attendance by exam", queries.ADMIN_ATTENDANCE_OF_EXAM, (1,),
+              queries.ATTENDANCE_KEYS, (10, "R1"), descending=True, arms=2),
+    *_listing("admin_attendance past MAX_MERGE_ARMS", queries.ADMIN_ATTENDANCE + _CLASS_FILTER["e"],
+              _CLASS, queries.ATTENDANCE_KEYS, (10, "R1"), descending=True, allowed=(SORTED,)),
+    ("attendance_report: exam class", queries.EXAM_ATTENDANCE, (1,), ()),
+    ("end_exam: ownership", queries.OWN_ACTIVE_EXAM, (1, "F1"), ()),
+    *[(f"delete_exam: {sql.split()[2]}", sql, (1,), ()) for sql in queries.EXAM_ROWS],
+    ("delete_exam: paper bodies", papers.DELETE_BODIES_SQL, (1, 1), ()),
+    ("regrade_exam: responses", grading.REGRADE_SQL, (1,), ()),
+    ("answer key: revision check", grading.KEY_REVISION_SQL, (1,), ()),
+    ("student_dashboard: active exams", queries.STUDENT_ACTIVE_EXAMS, _CLASS, ()),
+    ("student_papers: closed exam papers", papers.PAPER_LIST_SQL + papers.PAPER_LIST_ORDER,
+     _CLASS, ()),
+    ("student_exam: already submitted", queries.ALREADY_SUBMITTED, ("R1", 1), ()),
+    ("sessions: load", sessions.LOAD_SQL, ("x", 0), ()),
+    ("sessions: purge expired", sessions.PURGE_SQL, (0,), ()),
+    ("sessions: end a user's sessions", sessions.END_SQL.format(marks="?"), ("student:R1",), ()),
+    ("exam payload: revision check", payloads.REVISION_SQL, (1,), ()),
+    ("exam payload: exam + questions", payloads.LOAD_SQL, (1,), ()),
+    ("sms dispatcher: claim due messages", sms.CLAIM_SQL, ("w1", 0, 0, 50), (SORTED,)),
+    ("publish_results: parent messages", sms.RESULT_ROWS_SQL, (1,), (SORTED,)),
+    ("publish_results: queued messages", sms.QUEUED_SQL, ("exam:1",), ()),
+    ("publish_results: superseded message", sms.SUPERSEDE_SQL, ("exam:1", "+911"), ()),
+    ("publish_report: batch status", sms.BATCH_STATUS_SQL, ("exam:1",), ()),
+    ("publish_report: batch errors", sms.BATCH_ERRORS_SQL, ("exam:1",), ()),
+    ("exam_scheduler: active deadlines", scheduler.ACTIVE_DEADLINES_SQL, (), ()),
+    *[(f"start_exam: paper snapshot {i}", sql, (1,), ())
+      for i, sql in enumerate(papers.SNAPSHOT_SQL, 1)],
+    ("download_paper: paper rows", papers.PAPER_SQL, (1,), ()),
+    ("download_paper: exam closed", papers.CLOSED_SQL, (1,), ()),
+    ("admin_papers_archive: closed exams", papers.CLOSED_EXAMS_SQL + " ORDER BY id", (),
+     (SORTED,)),
+]
+
+# "SCAN t" and "SCAN t USING [COVERING] INDEX i" read the whole table or
+# index; only "SEARCH …" plans are bounded by the WHERE clause
+_FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS (\w+))?(?: USING (?:COVERING )?INDEX \w+)?$")
+
+
+def full_scans(con, sql, params=()):
+    # → tables read in full, plus SORTED when rows are sorted after reading
+    scans = []
+    for row in con.execute("EXPLAIN QUERY PLAN " + sql, params):
+        detail = row[3].strip()
+        m = _FULL_SCAN.match(detail)
+        if m:
+            scans.append(m.group(2) or m.group(1))
+        elif detail.startswith("USE TEMP B-TREE FOR") and detail.endswith("ORDER BY"):
+            scans.append(SORTED)
+    return scans
+
+
+def check_query_plans(con, checks=HOT_QUERIES):
+    failures = []
+    for label, sql, params, allowed in checks:
+        bad = [t for t in full_scans(con, sql, params) if t not in allowed]
+        if bad:
+            failures.append((label, bad))
+    return failures
+
+
+# =========================
+# CLI
+# =========================
+#   python migrations.py                → apply pending migrations to database.db
+#   python migrations.py --check-plans  → fail if a hot query does a full scan
+if __name__ == "__main__":
+    if "--check-plans" in sys.argv:
+        con = sqlite3.connect(":memory:")
+        migrate(con)
+        failures = check_query_plans(con)
+        for label, tables in failures:
+            print(f"❌ {label}: " + "; ".join(
+                "rows sorted in a temp b-tree" if t == SORTED else f"full scan of {t}" for t in tables
+            ))
+        if failures:
+            sys.exit(1)
+        print(f"✅ {len(HOT_QUERIES)} hot queries use indexes")
+    else:
+        con = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else "database.db")
+        applied = migrate(con)
+        print(f"✅ Schema at version {current_version(con)} (applied: {applied or 'none'})")
+        con.close()
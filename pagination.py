@@ -0,0 +1,176 @@
+import base64, json, threading, time
+from urllib.parse import urlencode
+
+
+# =========================
+# KEYSET PAGINATION
+# =========================
+# Listings are paged on an indexed sort key instead of OFFSET: the cursor
+# is the key of the last (or first) row shown and the next page starts
+# with "WHERE (key) > (cursor)". Every page costs the same however deep
+# the reader goes, and rows inserted meanwhile never shift a page.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+_CURSOR_ARGS = ("after", "before", "partial")
+
+
+def page_size(args, default=DEFAULT_PAGE_SIZE):
+    try:
+        size = int(args.get("size", default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    # A tampered or stale cursor just means "first page"
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+class Page:
+
+    def __init__(self, rows, size, total, path, args, next_key=None, prev_key=None):
+        self.rows = rows
+        self.size = size
+        self.total = total
+        self.path = path
+        self.filters = {k: v for k, v in args.items() if k not in _CURSOR_ARGS}
+        self.next = encode_cursor(next_key) if next_key is not None else None
+        self.prev = encode_cursor(prev_key) if prev_key is not None else None
+
+    def url(self, **cursor):
+        query = urlencode({**self.filters, **cursor})
+        return f"{self.path}?{query}" if query else self.path
+
+    @property
+    def next_url(self):
+        return self.url(after=self.next) if self.next else None
+
+    @property
+    def prev_url(self):
+        return self.url(before=self.prev) if self.prev else None
+
+    @property
+    def first_url(self):
+        return self.url()
+
+
+# Listings over several exams (a faculty's results, a class's results) are
+# paged as one arm per exam, each walking its own (exam_id, key) index
+# range; SQLite merges the arms in key order (UNION ALL + ORDER BY on the
+# row fields) instead of sorting every matching row for each page. Up to
+# MAX_MERGE_ARMS arms; beyond that the caller pages the plain query.
+MAX_MERGE_ARMS = 200
+
+
+def keyset_sql(sql, keys, descending=False, backwards=False, cursor=True, arms=1):
+    # sql + keyset condition (when paging from a cursor) + ORDER BY + LIMIT ?;
+    # parameters are the cursor values, then the page size. arms > 1 → that
+    # many copies of sql (each with its parameters and the cursor values)
+    # merged with UNION ALL
+    exprs = ", ".join(e for e, _ in keys)
+
+    # Walking backwards = flip both the comparison and the order
+    forward_op, order = ("<", "DESC") if descending else (">", "ASC")
+    if backwards:
+        forward_op = "<" if forward_op == ">" else ">"
+        order = "ASC" if order == "DESC" else "DESC"
+
+    if cursor:
+        marks = ", ".join("?" * len(keys))
+        sql += f" AND ({exprs}) {forward_op} ({marks})"
+    if arms > 1:
+        # a compound SELECT can only be ordered by its result columns →
+        # the key fields must be named ones (r.roll AS roll)
+        sql = " UNION ALL ".join([sql] * arms)
+        keys = [(f, f) for _, f in keys]
+    return sql + " ORDER BY " + ", ".join(f"{e} {order}" for e, _ in keys) + " LIMIT ?"
+
+
+def paginate(con, sql, params, keys, args, path, descending=False, total=None, merge=None):
+    # sql     → SELECT … WHERE … (no ORDER BY / LIMIT); the keyset condition
+    #           is appended with AND
+    # keys    → [(sql expression, row field), …], unique together
+    # merge   → [leading params, …]: one arm of sql per entry (e.g. [exam_id]
+    #           for "WHERE r.exam_id=? AND …"), each followed by params
+    size = page_size(args)
+    fields = [f for _, f in keys]
+
+    after = decode_cursor(args.get("after"))
+    before = None if after else decode_cursor(args.get("before"))
+    cursor = after or before
+    if cursor is not None and len(cursor) != len(keys):
+        cursor = after = before = None
+
+    backwards = before is not None
+    arm = list(params) + (cursor or [])
+    if merge is None:
+        query = keyset_sql(sql, keys, descending, backwards, cursor is not None)
+        params = arm + [size + 1]
+    else:
+        query = keyset_sql(sql, keys, descending, backwards, cursor is not None, len(merge))
+        params = [p for lead in merge for p in (*lead, *arm)] + [size + 1]
+
+    rows = con.execute(query, params).fetchall() if merge != [] else []
+    more = len(rows) > size
+    rows = rows[:size]
+    if backwards:
+        rows.reverse()
+
+    def key(row):
+        return [row[f] for f in fields]
+
+    next_key = prev_key = None
+    if rows:
+        if more or backwards:
+            next_key = key(rows[-1])
+        if (more and backwards) or after is not None:
+            prev_key = key(rows[0])
+
+    return Page(rows, size, total, path, args, next_key, prev_key)
+
+
+# =========================
+# LISTING TOTALS
+# =========================
+# "N results" under a listing does not need to be exact to the second:
+# totals are loaded once per filter combination and reused for `ttl`
+# seconds. Loaders should read exam_stats where they can.
+class CountCache:
+
+    def __init__(self, ttl=30, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._counts.get(key)
+        if hit is not None and hit[1] > now:
+            return hit[0]
+
+        value = loader()
+        with self._lock:
+            if len(self._counts) >= self.max_entries:
+                self._counts.clear()
+            self._counts[key] = (value, now + self.ttl)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
@@ -0,0 +1,222 @@
+import sys, time
+from functools import lru_cache
+from io import BytesIO
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+
+# =========================
+# QUESTION PAPER LAYOUT
+# =========================
+# Text is measured with the font's metrics and wrapped to the column
+# width, then whole question blocks are packed onto pages top to bottom.
+# A block that does not fit in what is left of a page starts the next
+# one; a block taller than a page is split between lines. One pass over
+# the questions → cost is linear in the paper size.
+#
+# Bump LAYOUT_VERSION whenever the output changes, so PDFs cached by
+# papers.PaperCache are rendered again.
+LAYOUT_VERSION = 2
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN_LEFT = 40
+MARGIN_RIGHT = 40
+MARGIN_TOP = 42
+MARGIN_BOTTOM = 60
+QUESTION_GAP = 12
+
+
+class Style:
+
+    __slots__ = ("font", "size", "leading", "indent", "widths")
+
+    def __init__(self, font, size, leading, indent):
+        self.font = font
+        self.size = size
+        self.leading = leading
+        self.indent = indent
+        self.widths = {}          # word → width, shared by every render
+
+    def width(self, text):
+        w = self.widths.get(text)
+        if w is None:
+            w = stringWidth(text, self.font, self.size)
+            if len(self.widths) < 50000:
+                self.widths[text] = w
+        return w
+
+
+@lru_cache(maxsize=None)
+def style(font, size, indent=0, leading=None):
+    return Style(font, size, leading or size * 1.3, indent)
+
+
+TITLE = style("Helvetica-Bold", 14, 0, 20)
+QUESTION = style("Helvetica-Bold", 11, 0)
+OPTION = style("Helvetica", 10.5, 20)
+ANSWER = style("Helvetica-Oblique", 10.5, 20)
+KEY = style("Helvetica", 11, 0, 17)
+
+
+# ---------- wrapping ----------
+def wrap(text, st, width):
+    # Greedy fill; a single word wider than the line is broken by characters
+    space = st.width(" ")
+    lines, line, used = [], [], 0.0
+
+    for word in (text or "").split():
+        w = st.width(word)
+        if w > width:
+            if line:
+                lines.append(" ".join(line))
+                line, used = [], 0.0
+            lines.extend(_break_word(word, st, width))
+            continue
+        extra = w + (space if line else 0)
+        if line and used + extra > width:
+            lines.append(" ".join(line))
+            line, used = [word], w
+        else:
+            line.append(word)
+            used += extra
+
+    if line or not lines:
+        lines.append(" ".join(line))
+    return lines
+
+
+def _break_word(word, st, width):
+    parts, start, used = [], 0, 0.0
+    for i, ch in enumerate(word):
+        w = st.width(ch)
+        if used + w > width and i > start:
+            parts.append(word[start:i])
+            start, used = i, 0.0
+        used += w
+    parts.append(word[start:])
+    return parts
+
+
+# ---------- packing ----------
+def question_block(n, q, answers=True):
+    # → [(style, text)] for one question
+    width = PAGE_WIDTH - MARGIN_LEFT - MARGIN_RIGHT
+    block = [(QUESTION, line) for line in wrap(f"{n}. {q['question'] or ''}", QUESTION, width)]
+    for label in ("a", "b", "c", "d"):
+        text = f"{label.upper()}) {q[label] or ''}"
+        block += [(OPTION, line) for line in wrap(text, OPTION, width - OPTION.indent)]
+    if answers:
+        block.append((ANSWER, f"Answer: {(q['correct'] or '').upper()}"))
+    return block
+
+
+def paginate(blocks, title=None):
+    # blocks → pages of [(style, text, y)]
+    top = PAGE_HEIGHT - MARGIN_TOP
+    pages, page, y = [], [], top
+
+    if title:
+        y -= TITLE.leading
+        page.append((TITLE, title, y))
+        y -= QUESTION_GAP
+
+    for block in blocks:
+        height = sum(st.leading for st, _ in block)
+        fits_empty = height <= top - MARGIN_BOTTOM
+        if page and fits_empty and y - height < MARGIN_BOTTOM:
+            pages.append(page)
+            page, y = [], top
+
+        for st, text in block:
+            if y - st.leading < MARGIN_BOTTOM:
+                pages.append(page)
+                page, y = [], top
+            y -= st.leading
+            page.append((st, text, y))
+        y -= QUESTION_GAP
+
+    if page or not pages:
+        pages.append(page)
+    return pages
+
+
+# ---------- drawing ----------
+def draw(pages, footer=None):
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+
+    total = len(pages)
+    for number, page in enumerate(pages, 1):
+        # One text object per page instead of a drawString per line
+        text = pdf.beginText()
+        current = None
+        for st, line, y in page:
+            if st is not current:
+                text.setFont(st.font, st.size)
+                current = st
+            text.setTextOrigin(MARGIN_LEFT + st.indent, y)
+            text.textOut(line)
+        pdf.drawText(text)
+
+        pdf.setFont("Helvetica", 8)
+        label = f"{footer + ' – ' if footer else ''}Page {number} of {total}"
+        pdf.drawRightString(PAGE_WIDTH - MARGIN_RIGHT, MARGIN_BOTTOM / 2, label)
+        pdf.showPage()
+
+    pdf.save()
+    return buffer.getvalue()
+
+
+def render_questions(rows, answers=True, title=None):
+    blocks = (question_block(n, q, answers) for n, q in enumerate(rows, 1))
+    return draw(paginate(blocks, title), footer=title)
+
+
+def render_key(rows, title=None):
+    blocks = ([(KEY, f"{n}. {(q['correct'] or '').upper()}")] for n, q in enumerate(rows, 1))
+    return draw(paginate(blocks, title), footer=title)
+
+
+# =========================
+# BENCHMARK
+# =========================
+#   python paper_layout.py bench  → render time for 10 / 100 / 1000 questions
+def _sample(n):
+    filler = "Which of the following statements about the given data structure is correct"
+    return [
+        {
+            "question": f"{filler} when the input size grows to {i * 17} elements"
+                        + (" and it is also accessed concurrently" * (i % 4)),
+            "a": "Constant time for every operation",
+            "b": "Logarithmic time amortized over a sequence of operations",
+            "c": "Linear time in the worst case",
+            "d": "None of the above",
+            "correct": "abcd"[i % 4],
+        }
+        for i in range(n)
+    ]
+
+
+def bench(sizes=(10, 100, 1000), repeat=3):
+    results = []
+    for n in sizes:
+        rows = _sample(n)
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            pdf = render_questions(rows, title="Benchmark")
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results.append((n, best, len(pdf)))
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "bench":
+        print("usage: python paper_layout.py bench")
+        sys.exit(1)
+
+    for n, seconds, size in bench():
+        print(f"{n:>5} questions: {seconds * 1000:8.1f} ms  "
+              f"({seconds * 1e6 / n:7.1f} µs/question, {size // 1024} KB)")
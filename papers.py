@@ -0,0 +1,297 @@
+import hashlib, json, multiprocessing, os, sqlite3, sys, threading, uuid
+from concurrent.futures import ProcessPoolExecutor
+from zipfile import ZipFile, ZIP_STORED
+from paper_layout import LAYOUT_VERSION, render_questions, render_key
+
+
+# =========================
+# QUESTION PAPER PDF
+# =========================
+PAPER_FIELDS = ("question", "a", "b", "c", "d", "correct")
+
+
+# =========================
+# PAPER ARCHIVE
+# =========================
+# paper_archive    → one header row per exam (class, date, question count)
+# paper_bodies     → each distinct question stored once, keyed by the hash
+#                    of its text, options and answer
+# paper_questions  → (exam_id, position) → body hash
+# The snapshot is taken when the exam starts, straight from `questions`
+# with INSERT … SELECT; papers are only listed and served once the exam
+# is closed.
+def body_hash(question, a, b, c, d, correct):
+    return hashlib.sha256(
+        json.dumps([question, a, b, c, d, correct]).encode()
+    ).hexdigest()
+
+
+def register_functions(con):
+    # paper_hash(question, a, b, c, d, correct) for the snapshot queries
+    con.create_function("paper_hash", 6, body_hash, deterministic=True)
+
+
+# Each statement takes (exam_id,)
+SNAPSHOT_SQL = (
+    "DELETE FROM paper_questions WHERE exam_id=?",
+    """
+    INSERT INTO paper_archive
+    (exam_id, year, branch, section, exam_date, questions, archived_at)
+    SELECT e.id, e.year, e.branch, e.section, e.exam_date,
+           (SELECT COUNT(*) FROM questions WHERE exam_id = e.id),
+           DATETIME('now')
+    FROM exams e WHERE e.id=?
+    ON CONFLICT(exam_id) DO UPDATE SET
+        year=excluded.year, branch=excluded.branch, section=excluded.section,
+        exam_date=excluded.exam_date, questions=excluded.questions,
+        archived_at=excluded.archived_at
+    """,
+    """
+    INSERT OR IGNORE INTO paper_bodies (hash, question, a, b, c, d, correct)
+    SELECT paper_hash(question, a, b, c, d, correct), question, a, b, c, d, correct
+    FROM questions WHERE exam_id=?
+    """,
+    """
+    INSERT INTO paper_questions (exam_id, position, hash)
+    SELECT exam_id,
+           ROW_NUMBER() OVER (ORDER BY id),
+           paper_hash(question, a, b, c, d, correct)
+    FROM questions WHERE exam_id=?
+    """,
+)
+
+# Bodies go only when no other exam's paper still uses them
+DELETE_BODIES_SQL = """
+    DELETE FROM paper_bodies
+    WHERE hash IN (SELECT hash FROM paper_questions WHERE exam_id=?)
+      AND NOT EXISTS (
+          SELECT 1 FROM paper_questions q
+          WHERE q.hash = paper_bodies.hash AND q.exam_id != ?
+      )
+"""
+
+PAPER_LIST_SQL = """
+    SELECT pa.exam_id, pa.year, pa.branch, pa.section, pa.exam_date, pa.questions
+    FROM paper_archive pa
+    JOIN exams e ON e.id = pa.exam_id
+    WHERE pa.year=? AND pa.branch=? AND pa.section=?
+      AND e.status='INACTIVE'
+"""
+PAPER_LIST_ORDER = " ORDER BY pa.exam_date DESC, pa.exam_id DESC"
+
+PAPER_SQL = """
+    SELECT b.question, b.a, b.b, b.c, b.d, b.correct
+    FROM paper_questions pq
+    JOIN paper_bodies b ON b.hash = pq.hash
+    JOIN exams e ON e.id = pq.exam_id
+    WHERE pq.exam_id=? AND e.status='INACTIVE'
+    ORDER BY pq.position
+"""
+
+# Cache hits re-check this: a restarted exam must not serve its paper
+CLOSED_SQL = "SELECT 1 FROM exams WHERE id=? AND status='INACTIVE'"
+
+
+def snapshot_paper(con, exam_id):
+    # Runs in the caller's transaction; a restarted exam is re-snapshotted
+    for sql in SNAPSHOT_SQL:
+        con.execute(sql, (exam_id,))
+
+
+def delete_paper(con, exam_id):
+    con.execute(DELETE_BODIES_SQL, (exam_id, exam_id))
+    con.execute("DELETE FROM paper_questions WHERE exam_id=?", (exam_id,))
+    con.execute("DELETE FROM paper_archive WHERE exam_id=?", (exam_id,))
+
+
+def list_papers(con, year, branch, section, date=None):
+    query = PAPER_LIST_SQL
+    params = [year, branch, section]
+    if date:
+        query += " AND pa.exam_date=?"
+        params.append(date)
+    return con.execute(query + PAPER_LIST_ORDER, params).fetchall()
+
+
+def load_paper(con, exam_id):
+    return con.execute(PAPER_SQL, (exam_id,)).fetchall()
+
+
+def paper_digest(exam_id, rows):
+    # Layout version is part of the address → a new layout re-renders
+    h = hashlib.sha256(f"{exam_id}:{LAYOUT_VERSION}".encode())
+    for q in rows:
+        h.update(json.dumps([q[f] for f in PAPER_FIELDS]).encode())
+    return h.hexdigest()
+
+
+def render_paper(rows, answers=True, title=None):
+    return render_questions(rows, answers, title)
+
+
+def render_answer_key(rows, title=None):
+    return render_key(rows, title)
+
+
+# =========================
+# PDF CACHE (CONTENT-ADDRESSED)
+# =========================
+# One file per (exam, paper digest) under `directory`. A changed paper gets
+# a new digest → a new file and a new ETag, so a stale PDF is never served;
+# invalidate() also removes the old files. The exam → digest index is per
+# process; a miss costs one archive read and a hash, not a render, and a
+# hit one exams lookup (the paper holds the answers → closed exams only).
+class PaperCache:
+
+    def __init__(self, directory="paper_cache"):
+        # absolute: send_file resolves relative paths against the app root
+        self.directory = os.path.abspath(directory)
+        self._index = {}              # exam_id → digest
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, exam_id, digest):
+        return os.path.join(self.directory, f"exam_{exam_id}_{digest[:32]}.pdf")
+
+    def get(self, con, exam_id):
+        # → (path, digest), or None when the exam has no archived paper
+        digest = self._index.get(exam_id)
+        if digest is not None and os.path.exists(self.path(exam_id, digest)):
+            if con.execute(CLOSED_SQL, (exam_id,)).fetchone() is None:
+                with self._lock:
+                    self._index.pop(exam_id, None)
+                return None
+            return self.path(exam_id, digest), digest
+        return self.build(con, exam_id)
+
+    def build(self, con, exam_id):
+        rows = load_paper(con, exam_id)
+        if not rows:
+            self.invalidate(exam_id)
+            return None
+
+        digest = paper_digest(exam_id, rows)
+        path = self.path(exam_id, digest)
+        if not os.path.exists(path):
+            # Write aside, then rename → readers never see half a PDF
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(render_paper(rows, title=f"Exam {exam_id} – Question Paper"))
+            os.replace(tmp, path)
+            self._remove_stale(exam_id, keep=path)
+
+        with self._lock:
+            self._index[exam_id] = digest
+        return path, digest
+
+    def warm(self, con, exam_ids):
+        return [exam_id for exam_id in exam_ids if self.build(con, exam_id)]
+
+    def invalidate(self, exam_id):
+        with self._lock:
+            self._index.pop(exam_id, None)
+        self._remove_stale(exam_id)
+
+    def _remove_stale(self, exam_id, keep=None):
+        prefix = f"exam_{exam_id}_"
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(prefix) and name.endswith(".pdf") and path != keep:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+# =========================
+# BATCH ARCHIVE (ZIP)
+# =========================
+# Question paper + answer key for many exams in one ZIP. Rendering is
+# CPU-bound pure Python, so it is spread over worker processes; the
+# parent only reads the database and writes the ZIP. Workers get plain
+# dicts and return PDF bytes — they never touch the database.
+CLOSED_EXAMS_SQL = """
+    SELECT id FROM exams e
+    WHERE status='INACTIVE'
+      AND EXISTS (SELECT 1 FROM paper_archive p WHERE p.exam_id = e.id)
+"""
+
+
+def closed_exams(con, year=None, branch=None, section=None):
+    query = CLOSED_EXAMS_SQL
+    params = []
+    for col, value in (("year", year), ("branch", branch), ("section", section)):
+        if value:
+            query += f" AND {col}=?"
+            params.append(value)
+    return [r[0] for r in con.execute(query + " ORDER BY id", params)]
+
+
+def _paper_jobs(con, exam_ids):
+    for exam_id in exam_ids:
+        exam = con.execute(
+            "SELECT exam_id AS id, year, branch, section, exam_date FROM paper_archive WHERE exam_id=?",
+            (exam_id,)
+        ).fetchone()
+        rows = load_paper(con, exam_id)
+        if exam and rows:
+            yield dict(exam), [dict(r) for r in rows]
+
+
+def _render_exam(job):
+    exam, rows = job
+    title = f"Exam {exam['id']} – {exam['year']} {exam['branch'].upper()} {exam['section']} – {exam['exam_date']}"
+    return (
+        exam,
+        render_paper(rows, answers=False, title=title),
+        render_answer_key(rows, title=f"{title} – Answer Key")
+    )
+
+
+_WORKER_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+def build_archive(con, exam_ids, out, workers=None):
+    # out → path or writable binary file object
+    jobs = list(_paper_jobs(con, exam_ids))
+    if not jobs:
+        return 0
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    # PDFs are already compressed → store, don't deflate again
+    with ZipFile(out, "w", ZIP_STORED) as zf:
+        if workers > 1:
+            # Never fork the app: its pool, scheduler and SMS threads (and
+            # any locks they hold) would be copied into every worker
+            with ProcessPoolExecutor(workers, mp_context=_WORKER_CONTEXT) as pool:
+                rendered = pool.map(_render_exam, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+                _write_archive(zf, rendered)
+        else:
+            _write_archive(zf, map(_render_exam, jobs))
+    return len(jobs)
+
+
+def _write_archive(zf, rendered):
+    for exam, paper, key in rendered:
+        folder = f"{exam['year']}_{exam['branch']}_{exam['section']}/exam_{exam['id']}_{exam['exam_date']}"
+        zf.writestr(f"{folder}/question_paper.pdf", paper)
+        zf.writestr(f"{folder}/answer_key.pdf", key)
+
+
+# =========================
+# CLI
+# =========================
+#   python papers.py archive papers.zip [database.db]  → every closed exam
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "archive":
+        print("usage: python papers.py archive <out.zip> [database.db]")
+        sys.exit(1)
+
+    con = sqlite3.connect(sys.argv[3] if len(sys.argv) > 3 else "database.db", timeout=30)
+    con.row_factory = sqlite3.Row
+    n = build_archive(con, closed_exams(con), sys.argv[2],
+                      workers=int(os.getenv("PAPER_WORKERS", "0")) or None)
+    con.close()
+    print(f"✅ {n} exams archived to {sys.argv[2]}")
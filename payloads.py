@@ -0,0 +1,157 @@
+import json, threading
+from flask import render_template, get_template_attribute
+from markupsafe import Markup
+from grading import OPTIONS
+
+
+# =========================
+# EXAM QUESTION PAYLOADS
+# =========================
+# Everything the exam page needs that is the same for every student:
+# exam class + duration and the question set, both as JSON and as
+# pre-rendered HTML. Built once when the exam starts, evicted when it
+# closes or is deleted; a miss loads it with a single read, and
+# concurrent misses for one exam wait for that one read.
+# Other worker processes close exams and upload questions too, so every
+# hit is checked against exams.revision (bumped on each question upload)
+# and status with one primary-key read; a closed exam or a stale revision
+# is dropped here as well.
+#
+# Each question is kept as head + tail around its options, with every
+# option pre-rendered under every letter it can be shown as, so a
+# per-student order (shuffling.Shuffle) is only string joins.
+REVISION_SQL = "SELECT revision FROM exams WHERE id=? AND status='ACTIVE'"
+LOAD_SQL = """
+    SELECT e.revision, e.year, e.branch, e.section, e.duration,
+           q.id, q.question, q.a, q.b, q.c, q.d
+    FROM exams e
+    LEFT JOIN questions q ON q.exam_id = e.id
+    WHERE e.id=? AND e.status='ACTIVE'
+    ORDER BY q.id
+"""
+
+_OPTIONS_SLOT = "\x00options\x00"
+_IDENTITY = tuple(range(len(OPTIONS)))
+
+
+class ExamPayload:
+
+    __slots__ = ("exam_id", "revision", "year", "branch", "section", "duration",
+                 "questions", "heads", "tails", "labels", "html", "json")
+
+    def __init__(self, exam_id, exam, questions, heads, tails, labels):
+        self.exam_id = exam_id
+        self.revision = exam["revision"]
+        self.year = exam["year"]
+        self.branch = exam["branch"]
+        self.section = exam["section"]
+        self.duration = exam["duration"]
+        self.questions = questions
+        self.heads = heads
+        self.tails = tails
+        self.labels = labels          # [question][real option][shown letter] → <label>
+        self.html = self.render()
+        self.json = self.document()
+
+    def __len__(self):
+        return len(self.questions)
+
+    def eligible(self, student):
+        return (student["year"], student["branch"], student["section"]) == \
+               (self.year, self.branch, self.section)
+
+    def render(self, shuffle=None):
+        order = shuffle.order if shuffle else range(len(self.questions))
+        parts = []
+        for i in order:
+            labels = self.labels[i]
+            parts.append(self.heads[i])
+            for shown, real in enumerate(shuffle.options[i] if shuffle else _IDENTITY):
+                parts.append(labels[real][shown])
+            parts.append(self.tails[i])
+        return "".join(parts)
+
+    def document(self, shuffle=None):
+        order = shuffle.order if shuffle else range(len(self.questions))
+        questions = []
+        for i in order:
+            q = self.questions[i]
+            item = {"id": q["id"], "question": q["question"]}
+            for shown, real in enumerate(shuffle.options[i] if shuffle else _IDENTITY):
+                item[OPTIONS[shown]] = q[OPTIONS[real]]
+            questions.append(item)
+        return json.dumps({
+            "exam_id": self.exam_id,
+            "duration": self.duration,
+            "questions": questions,
+        }, separators=(",", ":"))
+
+
+class PayloadCache:
+
+    def __init__(self, template="partials/exam_question.html",
+                 option_template="partials/exam_option.html"):
+        self.template = template
+        self.option_template = option_template
+        self._payloads = {}
+        self._lock = threading.Lock()
+        self._building = {}           # exam_id → lock held by the builder
+
+    def load(self, con, exam_id):
+        rows = con.execute(LOAD_SQL, (exam_id,)).fetchall()
+        if not rows:
+            return None
+
+        questions = [
+            {"id": r["id"], "question": r["question"],
+             "a": r["a"], "b": r["b"], "c": r["c"], "d": r["d"]}
+            for r in rows if r["id"] is not None
+        ]
+        option = get_template_attribute(self.option_template, "option")
+        heads, tails, labels = [], [], []
+        for q in questions:
+            html = render_template(self.template, q=q, options=Markup(_OPTIONS_SLOT))
+            head, tail = html.split(_OPTIONS_SLOT)
+            heads.append(head)
+            tails.append(tail)
+            labels.append([
+                [str(option(q["id"], letter, q[real])) for letter in OPTIONS]
+                for real in OPTIONS
+            ])
+        return ExamPayload(exam_id, rows[0], questions, heads, tails, labels)
+
+    def build(self, con, exam_id):
+        payload = self.load(con, exam_id)
+        with self._lock:
+            if payload is None:
+                self._payloads.pop(exam_id, None)
+            else:
+                self._payloads[exam_id] = payload
+        return payload
+
+    def get(self, con, exam_id):
+        payload = self._payloads.get(exam_id)
+        if payload is not None:
+            row = con.execute(REVISION_SQL, (exam_id,)).fetchone()
+            if row is not None and row[0] == payload.revision:
+                return payload
+            self.evict(exam_id, payload)
+            if row is None:
+                return None
+
+        # Single flight: the first miss builds, the rest wait for it
+        with self._lock:
+            lock = self._building.setdefault(exam_id, threading.Lock())
+        with lock:
+            payload = self._payloads.get(exam_id)
+            if payload is None:
+                payload = self.build(con, exam_id)
+        with self._lock:
+            self._building.pop(exam_id, None)
+        return payload
+
+    def evict(self, exam_id, payload=None):
+        # payload → only if still that one (a newer build stays)
+        with self._lock:
+            if payload is None or self._payloads.get(exam_id) is payload:
+                self._payloads.pop(exam_id, None)
@@ -0,0 +1,261 @@
+import cProfile, io, pstats, random, re, threading, time
+from collections import deque
+from flask import g, request, has_request_context
+
+
+# =========================
+# REQUEST PROFILING
+# =========================
+# When enabled, every request is timed per route (url rule, not the raw
+# path) and every statement run through db() is timed with the number of
+# rows it returned or changed. A sample of requests also runs under
+# cProfile; the stats of those that turn out slow are kept.
+# All numbers are per process and held in bounded buffers.
+_WS = re.compile(r"\s+")
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+class Profiler:
+
+    def __init__(self, enabled=False, window=1000, slow_ms=500,
+                 profile_sample=0.0, keep_profiles=20, keep_slow_queries=50):
+        self.enabled = enabled
+        self.window = window
+        self.slow_ms = slow_ms
+        self.profile_sample = profile_sample
+        self.keep_slow_queries = keep_slow_queries
+
+        self._lock = threading.Lock()
+        self._routes = {}             # route → {"ms": deque, "sql_ms": deque, "sql": deque, "count"}
+        self._queries = {}            # normalized sql → {"calls", "ms", "max_ms", "rows"}
+        self._slow = []               # [(ms, sql, rows, route)] slowest single statements
+        self.profiles = deque(maxlen=keep_profiles)
+
+    # ---------- flask hooks ----------
+    def init_app(self, app):
+        app.before_request(self._before)
+        app.after_request(self._after)
+
+    def _before(self):
+        if not self.enabled:
+            return
+        g._perf = {"start": time.perf_counter(), "sql_ms": 0.0, "sql": 0, "profile": None}
+        if self.profile_sample and random.random() < self.profile_sample:
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+                g._perf["profile"] = prof
+            except ValueError:
+                # another profiler is already active on this thread
+                pass
+
+    def _after(self, response):
+        state = g.pop("_perf", None)
+        if state is None:
+            return response
+
+        ms = (time.perf_counter() - state["start"]) * 1000
+        route = f"{request.method} {request.url_rule.rule if request.url_rule else '<404>'}"
+
+        prof = state["profile"]
+        if prof is not None:
+            prof.disable()
+            if ms >= self.slow_ms:
+                out = io.StringIO()
+                pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(25)
+                self.profiles.appendleft({
+                    "route": route,
+                    "path": request.full_path,
+                    "ms": round(ms, 1),
+                    "at": time.strftime("%H:%M:%S"),
+                    "stats": out.getvalue(),
+                })
+
+        with self._lock:
+            r = self._routes.get(route)
+            if r is None:
+                r = self._routes[route] = {
+                    "ms": deque(maxlen=self.window),
+                    "sql_ms": deque(maxlen=self.window),
+                    "sql": deque(maxlen=self.window),
+                    "count": 0,
+                }
+            r["ms"].append(ms)
+            r["sql_ms"].append(state["sql_ms"])
+            r["sql"].append(state["sql"])
+            r["count"] += 1
+        return response
+
+    # ---------- SQL ----------
+    def wrap(self, con):
+        return TimedConnection(con, self) if self.enabled else con
+
+    def record_query(self, sql, ms, rows):
+        key = _WS.sub(" ", sql).strip()
+        state = g.get("_perf") if has_request_context() else None
+        if state is not None:
+            state["sql_ms"] += ms
+            state["sql"] += 1
+        route = request.url_rule.rule if state is not None and request.url_rule else None
+
+        with self._lock:
+            q = self._queries.get(key)
+            if q is None:
+                if len(self._queries) >= 2000:
+                    return
+                q = self._queries[key] = {"calls": 0, "ms": 0.0, "max_ms": 0.0, "rows": 0}
+            q["calls"] += 1
+            q["ms"] += ms
+            q["rows"] += rows or 0
+            q["max_ms"] = max(q["max_ms"], ms)
+
+            if len(self._slow) < self.keep_slow_queries or ms > self._slow[-1][0]:
+                self._slow.append((ms, key, rows, route))
+                self._slow.sort(key=lambda s: -s[0])
+                del self._slow[self.keep_slow_queries:]
+
+    def record_fetch(self, sql, ms, rows):
+        # sqlite steps a SELECT past its first row only as it is fetched
+        key = _WS.sub(" ", sql).strip()
+        state = g.get("_perf") if has_request_context() else None
+        if state is not None:
+            state["sql_ms"] += ms
+        with self._lock:
+            q = self._queries.get(key)
+            if q is not None:
+                q["rows"] += rows
+                q["ms"] += ms
+
+    # ---------- report ----------
+    def report(self):
+        with self._lock:
+            routes = [(name, list(r["ms"]), list(r["sql_ms"]), list(r["sql"]), r["count"])
+                      for name, r in self._routes.items()]
+            queries = [dict(q, sql=sql) for sql, q in self._queries.items()]
+            slow = list(self._slow)
+
+        route_rows = []
+        for name, ms, sql_ms, sql, count in routes:
+            ms_sorted = sorted(ms)
+            route_rows.append({
+                "route": name,
+                "count": count,
+                "p50": round(_percentile(ms_sorted, 50), 1),
+                "p95": round(_percentile(ms_sorted, 95), 1),
+                "p99": round(_percentile(ms_sorted, 99), 1),
+                "max": round(ms_sorted[-1], 1) if ms_sorted else 0,
+                "sql_ms": round(sum(sql_ms) / len(sql_ms), 1) if sql_ms else 0,
+                "sql": round(sum(sql) / len(sql), 1) if sql else 0,
+            })
+        route_rows.sort(key=lambda r: -r["p95"])
+
+        for q in queries:
+            q["avg_ms"] = round(q["ms"] / q["calls"], 2)
+            q["ms"] = round(q["ms"], 1)
+            q["max_ms"] = round(q["max_ms"], 2)
+        queries.sort(key=lambda q: -q["ms"])
+
+        return {
+            "enabled": self.enabled,
+            "routes": route_rows,
+            "queries": queries[:50],
+            "slow": [{"ms": round(ms, 2), "sql": sql, "rows": rows, "route": route}
+                     for ms, sql, rows, route in slow],
+            "profiles": list(self.profiles),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self._queries.clear()
+            self._slow.clear()
+            self.profiles.clear()
+
+
+# =========================
+# TIMED CONNECTION
+# =========================
+# Same interface as the pooled connection; execute() latency is recorded
+# on return, rows read from the cursor are added as they are fetched.
+class TimedConnection:
+
+    def __init__(self, con, profiler):
+        self._con = con
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._con, name)
+
+    def __enter__(self):
+        return self._con.__enter__()
+
+    def __exit__(self, *exc):
+        return self._con.__exit__(*exc)
+
+    def execute(self, sql, params=()):
+        started = time.perf_counter()
+        cur = self._con.execute(sql, params)
+        # rowcount is -1 for SELECT; those rows are counted as fetched
+        rows = cur.rowcount if cur.rowcount >= 0 else None
+        self._profiler.record_query(sql, (time.perf_counter() - started) * 1000, rows)
+        return TimedCursor(cur, sql, self._profiler)
+
+    def executemany(self, sql, seq):
+        started = time.perf_counter()
+        cur = self._con.executemany(sql, seq)
+        self._profiler.record_query(sql, (time.perf_counter() - started) * 1000, max(cur.rowcount, 0))
+        return cur
+
+
+class TimedCursor:
+
+    def __init__(self, cur, sql, profiler):
+        self._cur = cur
+        self._sql = sql
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def _fetched(self, started, n):
+        self._profiler.record_fetch(self._sql, (time.perf_counter() - started) * 1000, n)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cur.fetchone()
+        self._fetched(started, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = self._cur.fetchmany(size) if size is not None else self._cur.fetchmany()
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cur.fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+    def __iter__(self):
+        it, spent, n = iter(self._cur), 0.0, 0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    row = next(it)
+                except StopIteration:
+                    return
+                finally:
+                    spent += time.perf_counter() - started
+                n += 1
+                yield row
+        finally:
+            self._profiler.record_fetch(self._sql, spent * 1000, n)
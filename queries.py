@@ -0,0 +1,163 @@
+# =========================
+# ROUTE QUERIES
+# =========================
+# SQL of the hot route paths in app.py, kept here so that
+# `python migrations.py --check-plans` explains exactly what the routes
+# run (see migrations.HOT_QUERIES). Listings are a base SELECT ending in
+# a WHERE clause; filters are appended with AND and the keyset / ORDER BY
+# by pagination.keyset_sql.
+
+
+def class_filter(alias, year=None, branch=None, section=None):
+    # → (" AND <alias>.year=? …", params) for the parts that are set
+    sql, params = "", []
+    for column, value in (("year", year), ("branch", branch), ("section", section)):
+        if value:
+            sql += f" AND {alias}.{column}=?" if alias else f" AND {column}=?"
+            params.append(value)
+    return sql, params
+
+
+# ---------- admin ----------
+STUDENTS_IN_CLASS = """
+    SELECT COUNT(*) FROM students
+    WHERE year=? AND branch=? AND section=?
+"""
+
+STUDENT_LIST = "SELECT * FROM students WHERE 1=1"
+STUDENT_KEYS = [("roll", "roll")]
+
+_ADMIN_RESULT_ROWS = """
+    SELECT r.roll AS roll, s.name, s.year, s.branch, s.section,
+           r.marks, r.submit_time AS submit_time, r.late
+    FROM results r
+    JOIN students s ON r.roll=s.roll
+    JOIN exams e ON r.exam_id=e.id
+"""
+ADMIN_RESULTS = _ADMIN_RESULT_ROWS + "    WHERE 1=1\n"
+ADMIN_RESULTS_OF_EXAM = _ADMIN_RESULT_ROWS + "    WHERE r.exam_id=?\n"
+
+_ADMIN_ATTENDANCE_ROWS = """
+    SELECT
+        a.exam_id AS exam_id,
+        a.roll AS roll,
+        s.name,
+        s.year,
+        s.branch,
+        s.section,
+        e.exam_date,
+        r.marks,
+        a.status
+    FROM attendance a
+    JOIN students s ON a.roll = s.roll
+    JOIN exams e ON a.exam_id = e.id
+    LEFT JOIN results r
+        ON r.roll = s.roll AND r.exam_id = e.id
+"""
+ADMIN_ATTENDANCE = _ADMIN_ATTENDANCE_ROWS + "    WHERE 1=1\n"
+# Filtered → one arm per matching exam (CLASS_EXAMS + filters on e), each
+# a range of the attendance PK
+ADMIN_ATTENDANCE_OF_EXAM = _ADMIN_ATTENDANCE_ROWS + "    WHERE a.exam_id=?\n"
+EXAMS_ON_DATE = " AND e.exam_date=?"
+# Newest exam first, roll order within an exam (attendance PK)
+ATTENDANCE_KEYS = [("a.exam_id", "exam_id"), ("a.roll", "roll")]
+
+# ---------- results listings ----------
+# range on the raw column instead of DATE() → index usable
+RESULTS_ON_DATE = " AND r.submit_time >= ? AND r.submit_time < DATE(?, '+1 day')"
+RESULT_KEYS = [("r.submit_time", "submit_time"), ("r.roll", "roll")]
+
+# Filtered listings run *_OF_EXAM once per matching exam and merge the
+# arms in key order (see pagination.MAX_MERGE_ARMS); the exams are
+# CLASS_EXAMS / FACULTY_EXAM_IDS + the same filter on e
+CLASS_EXAMS = "SELECT e.id FROM exams e WHERE 1=1"
+FACULTY_EXAM_IDS = "SELECT e.id FROM exams e WHERE e.emp_id = ?"
+
+# {column} → an exam_stats counter, {where} → filter on exams e
+EXAM_STATS_TOTAL = """
+    SELECT COALESCE(SUM(st.{column}), 0)
+    FROM exams e
+    JOIN exam_stats st ON st.exam_id = e.id
+    WHERE {where}
+"""
+
+# ---------- faculty ----------
+FACULTY_EXAMS = """
+    SELECT e.*, st.enrolled AS student_count, st.submitted, st.marks_total
+    FROM exams e
+    LEFT JOIN exam_stats st ON st.exam_id = e.id
+    ORDER BY e.id DESC
+"""
+
+ACTIVE_EXAMS_IN_CLASS = """
+    SELECT COUNT(*) FROM exams
+    WHERE year=? AND branch=? AND section=? AND status='ACTIVE'
+"""
+
+CLASS_ROSTER = """
+    SELECT roll, name FROM students
+    WHERE year=? AND branch=? AND section=?
+"""
+
+QUESTION_COUNT = "SELECT COUNT(*) FROM questions WHERE exam_id=?"
+
+EXAM_COUNTERS = "SELECT enrolled, submitted FROM exam_stats WHERE exam_id=?"
+
+MONITOR_STUDENTS = """
+    SELECT s.roll, s.name,
+           CASE
+               WHEN r.roll IS NOT NULL THEN 'SUBMITTED'
+               ELSE 'WRITING'
+           END AS status,
+           r.marks
+    FROM students s
+    LEFT JOIN results r
+        ON s.roll = r.roll AND r.exam_id=?
+    WHERE s.year=? AND s.branch=? AND s.section=?
+    ORDER BY s.roll
+"""
+
+_FACULTY_RESULT_ROWS = """
+    SELECT r.roll AS roll, s.name, r.marks, r.submit_time AS submit_time, r.late,
+           e.year, e.branch, e.section, e.id AS exam_id
+    FROM results r
+    JOIN students s ON s.roll = r.roll
+    JOIN exams e ON e.id = r.exam_id
+"""
+FACULTY_RESULTS = _FACULTY_RESULT_ROWS + "    WHERE e.emp_id = ?\n"
+FACULTY_RESULTS_OF_EXAM = _FACULTY_RESULT_ROWS + "    WHERE r.exam_id = ?\n"
+
+OWN_ACTIVE_EXAM = """
+    SELECT id FROM exams
+    WHERE id=? AND emp_id=? AND status='ACTIVE'
+"""
+
+# Rows of an exam removed by delete_exam, besides its paper and stats
+EXAM_ROWS = (
+    "DELETE FROM questions WHERE exam_id=?",
+    "DELETE FROM results WHERE exam_id=?",
+    "DELETE FROM responses WHERE exam_id=?",
+    "DELETE FROM attendance WHERE exam_id=?",
+)
+
+# Every student of the exam's class, ABSENT unless marked otherwise
+EXAM_ATTENDANCE = """
+    SELECT s.roll, s.name,
+    IFNULL(a.status,'ABSENT') AS status
+    FROM exams e
+    JOIN students s
+    ON s.year=e.year AND s.branch=e.branch AND s.section=e.section
+    LEFT JOIN attendance a
+    ON s.roll=a.roll AND a.exam_id=e.id
+    WHERE e.id=?
+    ORDER BY s.roll
+"""
+
+# ---------- student ----------
+STUDENT_ACTIVE_EXAMS = """
+    SELECT * FROM exams
+    WHERE status='ACTIVE'
+    AND year=? AND branch=? AND section=?
+"""
+
+ALREADY_SUBMITTED = "SELECT 1 FROM results WHERE roll=? AND exam_id=?"
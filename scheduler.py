@@ -0,0 +1,205 @@
+import heapq, logging, threading, time
+
+log = logging.getLogger(__name__)
+
+
+# =========================
+# EXAM AUTO-CLOSE SCHEDULER
+# =========================
+# Min-heap of (deadline, exam_id). The thread sleeps until the earliest
+# deadline, closes every exam that is due in one UPDATE and runs the
+# post-close hooks for the exams it actually closed.
+#
+# Deadlines come straight from SQLite: start_time is stored by
+# DATETIME('now') (UTC), so strftime('%s') + duration*60 is the epoch.
+DEADLINE_SQL = "CAST(strftime('%s', start_time) AS INTEGER) + duration * 60"
+ACTIVE_DEADLINES_SQL = f"SELECT id, {DEADLINE_SQL} FROM exams WHERE status='ACTIVE'"
+
+
+# =========================
+# EXAM DEADLINE CACHE
+# =========================
+# exam_id → end of the writing window (epoch seconds). Filled when an exam
+# starts, at scheduler startup, or lazily with one query on a miss; the
+# submit path then checks the deadline with a dict lookup.
+class DeadlineCache:
+
+    def __init__(self):
+        self._deadlines = {}
+        self._lock = threading.Lock()
+
+    def get(self, con, exam_id):
+        deadline = self._deadlines.get(exam_id)
+        if deadline is None:
+            row = con.execute(
+                f"SELECT {DEADLINE_SQL} FROM exams WHERE id=?", (exam_id,)
+            ).fetchone()
+            if not row or row[0] is None:
+                return None
+            deadline = self.set(exam_id, row[0])
+        return deadline
+
+    def set(self, exam_id, deadline):
+        with self._lock:
+            self._deadlines[exam_id] = deadline
+        return deadline
+
+    def drop(self, exam_id):
+        with self._lock:
+            self._deadlines.pop(exam_id, None)
+
+
+class ExamScheduler:
+
+    # Exams close `grace` seconds after their deadline so that submissions
+    # racing the timer are still accepted (and flagged late).
+    def __init__(self, pool, grace=0, deadlines=None):
+        self.pool = pool
+        self.grace = grace
+        self.deadlines = deadlines if deadlines is not None else DeadlineCache()
+        self.hooks = []
+
+        self._heap = []
+        self._deadlines = {}          # exam_id → current deadline
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+
+    # ---------- deadlines ----------
+    def schedule(self, exam_id, deadline):
+        with self._cond:
+            self._deadlines[exam_id] = deadline
+            heapq.heappush(self._heap, (deadline, exam_id))
+            # Wake the thread if this is the new earliest deadline
+            if self._heap[0][1] == exam_id:
+                self._cond.notify()
+
+    def cancel(self, exam_id):
+        # Heap entry is left in place and skipped when popped
+        with self._cond:
+            self._deadlines.pop(exam_id, None)
+
+    def schedule_from_db(self, con, exam_id):
+        row = con.execute(
+            f"SELECT {DEADLINE_SQL} FROM exams WHERE id=? AND status='ACTIVE'",
+            (exam_id,)
+        ).fetchone()
+        if row and row[0] is not None:
+            self.deadlines.set(exam_id, row[0])
+            self.schedule(exam_id, row[0] + self.grace)
+
+    def load(self):
+        con = self.pool.connection()
+        try:
+            rows = con.execute(ACTIVE_DEADLINES_SQL).fetchall()
+        finally:
+            con.close()
+
+        for exam_id, deadline in rows:
+            if deadline is not None:
+                self.deadlines.set(exam_id, deadline)
+
+        with self._cond:
+            self._deadlines = {r[0]: r[1] + self.grace for r in rows if r[1] is not None}
+            self._heap = [(d, i) for i, d in self._deadlines.items()]
+            heapq.heapify(self._heap)
+            self._cond.notify()
+        return len(self._deadlines)
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, exam_id = heapq.heappop(self._heap)
+            if self._deadlines.get(exam_id) == deadline:
+                del self._deadlines[exam_id]
+                due.append(exam_id)
+        return due
+
+    def _next_wait(self):
+        # Drop stale entries from the top so the sleep is accurate
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.time())
+
+    # ---------- closing ----------
+    def add_hook(self, fn):
+        # fn(con, exam_ids) runs after the exams are committed as INACTIVE
+        self.hooks.append(fn)
+        return fn
+
+    def close_exams(self, con, exam_ids):
+        if not exam_ids:
+            return []
+
+        for exam_id in exam_ids:
+            self.cancel(exam_id)
+
+        marks = ",".join("?" * len(exam_ids))
+        try:
+            closed = [r[0] for r in con.execute(
+                f"UPDATE exams SET status='INACTIVE' "
+                f"WHERE status='ACTIVE' AND id IN ({marks}) RETURNING id",
+                list(exam_ids)
+            ).fetchall()]
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+
+        # Only the process that flipped the status runs the hooks
+        if closed:
+            self.run_hooks(con, closed)
+        return closed
+
+    def run_hooks(self, con, exam_ids):
+        for hook in self.hooks:
+            try:
+                hook(con, exam_ids)
+            except Exception:
+                log.exception("exam close hook %s failed for %s", hook.__name__, exam_ids)
+                con.rollback()
+
+    # ---------- thread ----------
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="exam-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stop:
+                    return
+                wait = self._next_wait()
+                if wait is None or wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                due = self._pop_due(time.time())
+
+            if due:
+                con = self.pool.connection()
+                try:
+                    self.close_exams(con, due)
+                except Exception:
+                    log.exception("auto-close failed for %s", due)
+                    # Retry shortly rather than leaving the exams ACTIVE
+                    for exam_id in due:
+                        self.schedule(exam_id, time.time() + 5)
+                finally:
+                    con.close()
+
+    def pending(self):
+        with self._cond:
+            return dict(self._deadlines)
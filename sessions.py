@@ -0,0 +1,227 @@
+import os, secrets, threading, time
+from collections import OrderedDict
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from werkzeug.datastructures import CallbackDict
+
+
+# =========================
+# SECRET KEY
+# =========================
+# SECRET_KEY from the environment, else a random key generated on first
+# start and kept in `path` (0600), so restarts keep sessions and the
+# per-student shuffles derived from it.
+def load_secret_key(path="instance/secret_key"):
+    key = os.getenv("SECRET_KEY")
+    if key:
+        return key
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Written aside, then linked into place: workers starting together
+    # never see a half-written file, and the first link wins
+    tmp = f"{path}.{os.getpid()}.{secrets.token_hex(4)}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(secrets.token_hex(32))
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+    finally:
+        os.remove(tmp)
+
+    with open(path, encoding="utf-8") as f:
+        return f.read().strip()
+
+
+# =========================
+# SERVER-SIDE SESSIONS
+# =========================
+# The cookie only carries a random session id; the data lives in the
+# `sessions` table (sid, user, data, expires) with a sliding TTL. A bounded
+# LRU of recently used sessions sits in front of it, so most requests read
+# no row at all. Cached entries are trusted for `cache_seconds` only,
+# which bounds how long another process's logout can go unseen here.
+# `user` ("student:<roll>", "faculty:<emp_id>", "admin:<username>") lets
+# end_sessions() log a user out everywhere.
+USER_KEYS = ("student", "faculty", "admin")
+
+LOAD_SQL = "SELECT data, user, expires FROM sessions WHERE sid=? AND expires > ?"
+PURGE_SQL = "DELETE FROM sessions WHERE expires <= ?"
+END_SQL = "DELETE FROM sessions WHERE user IN ({marks}) RETURNING sid"
+
+
+def session_user(data):
+    for key in USER_KEYS:
+        if data.get(key) is not None:
+            return f"{key}:{data[key]}"
+    return None
+
+
+class SessionStore:
+
+    def __init__(self, pool, ttl=8 * 3600, cache_size=10000, cache_seconds=30,
+                 purge_every=300):
+        self.pool = pool
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.cache_seconds = cache_seconds
+        self.purge_every = purge_every
+
+        self._cache = OrderedDict()   # sid → (data, user, expires, cached_at)
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "purged": 0}
+
+    # ---------- LRU ----------
+    def _remember(self, sid, data, user, expires):
+        with self._lock:
+            self._cache[sid] = (data, user, expires, time.time())
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def forget(self, sids):
+        with self._lock:
+            for sid in sids:
+                self._cache.pop(sid, None)
+
+    # ---------- reads ----------
+    def load(self, sid):
+        # → (data, user, expires) or None when unknown / expired
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(sid)
+            if entry is not None:
+                data, user, expires, cached_at = entry
+                if expires > now and now - cached_at < self.cache_seconds:
+                    self._cache.move_to_end(sid)
+                    self.stats["hits"] += 1
+                    return data, user, expires
+                del self._cache[sid]
+            self.stats["misses"] += 1
+
+        con = self.pool.dedicated()
+        try:
+            row = con.execute(LOAD_SQL, (sid, now)).fetchone()
+        finally:
+            con.close()
+        if row is None:
+            return None
+        self._remember(sid, row["data"], row["user"], row["expires"])
+        return row["data"], row["user"], row["expires"]
+
+    # ---------- writes ----------
+    def save(self, sid, data, user):
+        now = time.time()
+        expires = now + self.ttl
+        con = self.pool.dedicated()
+        try:
+            con.execute("""
+                INSERT INTO sessions (sid, user, data, expires) VALUES (?,?,?,?)
+                ON CONFLICT(sid) DO UPDATE SET
+                    user=excluded.user, data=excluded.data, expires=excluded.expires
+            """, (sid, user, data, expires))
+            if now - self._last_purge > self.purge_every:
+                self._last_purge = now
+                self.stats["purged"] += con.execute(PURGE_SQL, (now,)).rowcount
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            con.close()
+        self.stats["writes"] += 1
+        self._remember(sid, data, user, expires)
+        return expires
+
+    def delete(self, sid):
+        con = self.pool.dedicated()
+        try:
+            con.execute("DELETE FROM sessions WHERE sid=?", (sid,))
+            con.commit()
+        finally:
+            con.close()
+        self.forget([sid])
+
+    def end_sessions(self, con, users):
+        # Runs in the caller's transaction → e.g. a deleted student is
+        # logged out together with the delete. Returns the ended sids; the
+        # caller passes them to forget() once committed, as a request that
+        # reads a row before the commit would cache it again.
+        users = list(users)
+        sids = []
+        for i in range(0, len(users), 500):
+            part = users[i:i + 500]
+            marks = ",".join("?" * len(part))
+            sids += [r[0] for r in con.execute(END_SQL.format(marks=marks), part).fetchall()]
+        return sids
+
+
+class ServerSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial=None, sid=None, user=None, expires=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.user = user
+        self.expires = expires
+        self.modified = False
+
+
+class SqliteSessionInterface(SessionInterface):
+
+    serializer = session_json_serializer
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            entry = self.store.load(sid)
+            if entry is not None:
+                data, user, expires = entry
+                return ServerSession(self.serializer.loads(data), sid, user, expires)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.sid is not None:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        response.vary.add("Cookie")
+        user = session_user(session)
+        now = time.time()
+
+        if session.sid is not None and user != session.user:
+            # Login / logout / switch of user → new id (no fixation)
+            self.store.delete(session.sid)
+            session.sid = None
+
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        elif not session.modified and session.expires - now > self.store.ttl / 2:
+            # Unchanged and far from expiry → no write at all
+            return
+
+        self.store.save(session.sid, self.serializer.dumps(dict(session)), user)
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
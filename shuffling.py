@@ -0,0 +1,53 @@
+import hashlib, hmac, random
+
+
+# =========================
+# PER-STUDENT SHUFFLING
+# =========================
+# Each student sees the exam's questions, and the options of every
+# question, in an order seeded by HMAC(key, exam_id:roll). The same
+# student always gets the same order back, so nothing is stored per
+# student (no session, no table) and grading can undo it.
+#
+# Positions are key positions (see grading.AnswerKey: question-id order,
+# which is also the order of the cached payload). The form still names
+# each question by its id; the option value is the letter the student
+# saw, mapped back to the real option with `options`.
+OPTION_COUNT = 4
+
+
+class Shuffle:
+
+    __slots__ = ("order", "options")
+
+    def __init__(self, order, options):
+        self.order = order            # display position → key position
+        self.options = options        # key position → (shown option → real option)
+
+    def real_option(self, position, shown):
+        return self.options[position][shown]
+
+
+def seed(secret, exam_id, roll):
+    if isinstance(secret, str):
+        secret = secret.encode()
+    return hmac.new(secret, f"{exam_id}:{roll}".encode(), hashlib.sha256).digest()
+
+
+def shuffle_for(secret, exam_id, roll, n, questions=True, options=True):
+    # O(n): one Fisher–Yates pass over the questions, one per option set
+    rng = random.Random(seed(secret, exam_id, roll))
+
+    order = list(range(n))
+    if questions:
+        rng.shuffle(order)
+
+    identity = tuple(range(OPTION_COUNT))
+    perms = [identity] * n
+    if options:
+        for i in range(n):
+            p = list(identity)
+            rng.shuffle(p)
+            perms[i] = tuple(p)
+
+    return Shuffle(order, perms)
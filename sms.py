@@ -0,0 +1,393 @@
+import logging, os, random, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+
+# =========================
+# PHONE NUMBERS
+# =========================
+def normalize_phone(number):
+    number = (number or "").strip()
+    # Auto add +91 if missing
+    if number and not number.startswith("+"):
+        number = "+91" + number
+    return number
+
+
+# =========================
+# TRANSPORTS
+# =========================
+# A transport has send(to, body) → provider message id, raising on failure.
+class TwilioTransport:
+
+    def __init__(self, sid, token, from_):
+        from twilio.rest import Client
+        self.client = Client(sid, token)
+        self.from_ = from_
+
+    def send(self, to, body):
+        return self.client.messages.create(to=to, from_=self.from_, body=body).sid
+
+
+class StubTransport:
+    # Offline transport: records messages instead of sending them.
+    # `fail` is a callable(to, body) → True to simulate a provider error.
+
+    def __init__(self, fail=None, delay=0.0):
+        self.fail = fail
+        self.delay = delay
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, to, body):
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail and self.fail(to, body):
+            raise RuntimeError(f"stub failure for {to}")
+        with self._lock:
+            self.sent.append((to, body))
+            return f"stub-{len(self.sent)}"
+
+
+class UnconfiguredTransport:
+    # No provider configured: every send fails, so messages end up FAILED
+    # with the reason instead of being reported as sent.
+
+    def send(self, to, body):
+        raise RuntimeError("SMS not configured: set TWILIO_SID/TOKEN/FROM or SMS_TRANSPORT=stub")
+
+
+def make_transport():
+    # The stub only when asked for explicitly; it marks messages SENT
+    kind = os.getenv("SMS_TRANSPORT", "twilio")
+
+    if kind == "stub":
+        log.warning("SMS_TRANSPORT=stub: parent messages are recorded, not delivered")
+        return StubTransport()
+    if kind != "twilio":
+        raise ValueError(f"unknown SMS_TRANSPORT {kind!r} (use twilio or stub)")
+
+    missing = [v for v in ("TWILIO_SID", "TWILIO_TOKEN", "TWILIO_FROM") if not os.getenv(v)]
+    if missing:
+        log.error("SMS transport not configured (missing %s): parent messages will fail",
+                  ", ".join(missing))
+        return UnconfiguredTransport()
+    return TwilioTransport(
+        os.getenv("TWILIO_SID"),
+        os.getenv("TWILIO_TOKEN"),
+        os.getenv("TWILIO_FROM")
+    )
+
+
+# =========================
+# RATE LIMIT
+# =========================
+# Token bucket shared by all sender threads → never exceed the provider's
+# messages-per-second limit, however many workers are sending.
+class RateLimiter:
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# =========================
+# OUTBOX
+# =========================
+# Messages are written in the caller's transaction, so an SMS is queued
+# exactly when the data it reports is committed.
+def enqueue_sms(con, to, body, batch=None):
+    enqueue_many(con, [(to, body)], batch)
+
+
+def enqueue_many(con, messages, batch=None):
+    con.executemany(
+        "INSERT INTO sms_outbox (batch, phone, body, status, attempts, next_attempt_at, created_at) "
+        "VALUES (?, ?, ?, 'PENDING', 0, 0, DATETIME('now'))",
+        ((batch, to, body) for to, body in messages)
+    )
+
+
+# =========================
+# RESULT PUBLISHING
+# =========================
+# One message per parent phone for a whole exam, built from a single
+# results ⋈ students read. Siblings sharing a number get one combined SMS.
+RESULT_ROWS_SQL = """
+    SELECT s.roll, s.name, s.parent, s.year, s.branch, s.section, r.marks
+    FROM results r
+    JOIN students s ON s.roll = r.roll
+    WHERE r.exam_id=?
+    ORDER BY s.roll
+"""
+QUEUED_SQL = "SELECT phone, body FROM sms_outbox WHERE batch=? AND status!='FAILED'"
+SUPERSEDE_SQL = """
+    DELETE FROM sms_outbox
+    WHERE batch=? AND phone=? AND status IN ('PENDING', 'FAILED')
+"""
+BATCH_STATUS_SQL = """
+    SELECT COUNT(*) AS total,
+           SUM(status='SENT') AS sent,
+           SUM(status='FAILED') AS failed,
+           SUM(status IN ('PENDING', 'SENDING')) AS pending,
+           MIN(claimed_at) AS first_claim,
+           MAX(finished_at) AS last_finish
+    FROM sms_outbox
+    WHERE batch=?
+"""
+BATCH_ERRORS_SQL = """
+    SELECT phone, attempts, last_error FROM sms_outbox
+    WHERE batch=? AND status='FAILED'
+    ORDER BY id LIMIT 50
+"""
+
+
+def result_batch(exam_id):
+    return f"exam:{exam_id}"
+
+
+def build_result_messages(con, exam_id):
+    rows = con.execute(RESULT_ROWS_SQL, (exam_id,)).fetchall()
+
+    by_phone = {}
+    for r in rows:
+        phone = normalize_phone(r["parent"])
+        if phone:
+            by_phone.setdefault(phone, []).append(r)
+
+    messages = []
+    for phone, students in by_phone.items():
+        blocks = [
+            f"Student: {s['name']}\n"
+            f"Roll: {s['roll']}\n"
+            f"Marks: {s['marks']}\n\n"
+            f"Year: {s['year']}\n"
+            f"Branch: {s['branch']}\n"
+            f"Section: {s['section']}"
+            for s in students
+        ]
+        messages.append((phone, "KIET Exam Result\n\n" + "\n\n".join(blocks)))
+
+    return rows, messages
+
+
+def publish_results(con, exam_id):
+    batch = result_batch(exam_id)
+    rows, messages = build_result_messages(con, exam_id)
+
+    # Publishing twice must not send the same message twice; after a
+    # regrade only the parents whose message changed get the new one, and
+    # an older one still waiting in the outbox is dropped in its favour.
+    # FAILED messages don't count as queued: publishing again retries them
+    # (e.g. once the transport is configured) and drops the failed copy
+    queued = {
+        (r[0], r[1]) for r in con.execute(QUEUED_SQL, (batch,))
+    }
+    fresh = [(to, body) for to, body in messages if (to, body) not in queued]
+
+    superseded = 0
+    for to, _ in fresh:
+        superseded += con.execute(SUPERSEDE_SQL, (batch, to)).rowcount
+    enqueue_many(con, fresh, batch)
+    con.commit()
+
+    return {
+        "students": len(rows),
+        "messages": len(messages),
+        "queued": len(fresh),
+        "skipped": len(messages) - len(fresh),
+        "superseded": superseded,
+    }
+
+
+def publish_report(con, exam_id):
+    row = con.execute(BATCH_STATUS_SQL, (result_batch(exam_id),)).fetchone()
+
+    elapsed = None
+    if row["first_claim"] and row["last_finish"]:
+        elapsed = max(row["last_finish"] - row["first_claim"], 0.001)
+
+    errors = con.execute(BATCH_ERRORS_SQL, (result_batch(exam_id),)).fetchall()
+
+    return {
+        "total": row["total"],
+        "sent": row["sent"] or 0,
+        "failed": row["failed"] or 0,
+        "pending": row["pending"] or 0,
+        "seconds": round(elapsed, 2) if elapsed else None,
+        "per_second": round((row["sent"] or 0) / elapsed, 2) if elapsed else None,
+        "errors": errors,
+    }
+
+
+# =========================
+# DISPATCHER
+# =========================
+CLAIM_SQL = """
+    UPDATE sms_outbox
+    SET status='SENDING', claimed_by=?, claimed_at=?, attempts=attempts+1
+    WHERE id IN (
+        SELECT id FROM sms_outbox
+        WHERE status='PENDING' AND next_attempt_at <= ?
+        ORDER BY id
+        LIMIT ?
+    )
+    RETURNING id, phone, body, attempts
+"""
+
+
+class SmsDispatcher:
+
+    def __init__(self, pool, transport, batch_size=50, workers=8,
+                 poll_interval=1.0, max_attempts=5, base_delay=5.0,
+                 stale_after=300, rate=None):
+        self.pool = pool
+        self.transport = transport
+        self.limiter = RateLimiter(rate) if rate else None
+        self.batch_size = batch_size
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.stale_after = stale_after
+
+        self.worker_id = uuid.uuid4().hex[:12]
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+
+    # ---------- lifecycle ----------
+    def start(self):
+        if self._thread is not None:
+            return
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="sms")
+        self._thread = threading.Thread(target=self._run, name="sms-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        self._recover_stale()
+        while not self._stop.is_set():
+            try:
+                sent = self.dispatch_once()
+            except Exception:
+                log.exception("sms dispatch round failed")
+                sent = 0
+            # Keep draining while there is work, otherwise sleep
+            if not sent:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    # ---------- one round ----------
+    def _claim(self, con):
+        now = time.time()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            rows = con.execute(
+                CLAIM_SQL, (self.worker_id, now, now, self.batch_size)
+            ).fetchall()
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        return rows
+
+    def _send(self, row):
+        if self.limiter is not None:
+            self.limiter.acquire()
+        try:
+            return row, self.transport.send(row["phone"], row["body"]), None
+        except Exception as e:
+            return row, None, str(e)[:500]
+
+    def _backoff(self, attempts):
+        delay = self.base_delay * (2 ** (attempts - 1))
+        return delay + random.uniform(0, delay / 10)
+
+    def dispatch_once(self):
+        con = self.pool.connection()
+        try:
+            rows = self._claim(con)
+            if not rows:
+                return 0
+
+            if self._executor is not None:
+                outcomes = list(self._executor.map(self._send, rows))
+            else:
+                outcomes = [self._send(r) for r in rows]
+
+            sent, retry, failed = [], [], []
+            now = time.time()
+            for row, provider_id, error in outcomes:
+                if error is None:
+                    sent.append((provider_id, row["id"]))
+                elif row["attempts"] >= self.max_attempts:
+                    failed.append((error, row["id"]))
+                else:
+                    retry.append((now + self._backoff(row["attempts"]), error, row["id"]))
+
+            con.executemany(
+                "UPDATE sms_outbox SET status='SENT', provider_id=?, sent_at=DATETIME('now'), "
+                "finished_at=?, last_error=NULL WHERE id=?",
+                ((pid, now, i) for pid, i in sent))
+            con.executemany(
+                "UPDATE sms_outbox SET status='PENDING', next_attempt_at=?, last_error=? "
+                "WHERE id=?", retry)
+            con.executemany(
+                "UPDATE sms_outbox SET status='FAILED', finished_at=?, last_error=? WHERE id=?",
+                ((now, err, i) for err, i in failed))
+            con.commit()
+            return len(rows)
+        finally:
+            con.close()
+
+    def _recover_stale(self):
+        # Rows left SENDING by a crashed worker go back to the queue
+        con = self.pool.connection()
+        try:
+            con.execute(
+                "UPDATE sms_outbox SET status='PENDING' "
+                "WHERE status='SENDING' AND claimed_at < ?",
+                (time.time() - self.stale_after,)
+            )
+            con.commit()
+        finally:
+            con.close()
+
+    # ---------- reporting ----------
+    def stats(self, con):
+        return {
+            r["status"]: r["n"]
+            for r in con.execute(
+                "SELECT status, COUNT(*) AS n FROM sms_outbox GROUP BY status"
+            )
+        }
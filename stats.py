@@ -0,0 +1,124 @@
+import sqlite3, sys
+
+
+# =========================
+# MATERIALIZED EXAM STATS
+# =========================
+# One exam_stats row per exam: enrolled students in the exam's class,
+# submitted results, PRESENT attendance and the sum of marks (average =
+# marks_total / submitted). Kept up to date incrementally by the write
+# paths below, each inside the caller's transaction; rebuild() recomputes
+# from the base tables and check() reports drift.
+COMPUTED_SQL = """
+    SELECT e.id AS exam_id,
+           (SELECT COUNT(*) FROM students s
+            WHERE s.year = e.year AND s.branch = e.branch AND s.section = e.section) AS enrolled,
+           (SELECT COUNT(*) FROM results r WHERE r.exam_id = e.id) AS submitted,
+           (SELECT COUNT(*) FROM attendance a
+            WHERE a.exam_id = e.id AND a.status = 'PRESENT') AS present,
+           (SELECT COALESCE(SUM(r.marks), 0) FROM results r WHERE r.exam_id = e.id) AS marks_total
+    FROM exams e
+"""
+
+
+def rebuild(con, exam_id=None):
+    where, params = ("WHERE e.id=?", (exam_id,)) if exam_id is not None else ("", ())
+    con.execute(
+        "INSERT OR REPLACE INTO exam_stats (exam_id, enrolled, submitted, present, marks_total) "
+        + COMPUTED_SQL + where,
+        params
+    )
+    if exam_id is None:
+        con.execute("DELETE FROM exam_stats WHERE exam_id NOT IN (SELECT id FROM exams)")
+
+
+def check(con):
+    stored = {
+        r["exam_id"]: tuple(r)[1:]
+        for r in con.execute(
+            "SELECT exam_id, enrolled, submitted, present, marks_total FROM exam_stats"
+        )
+    }
+    drift = []
+    for r in con.execute(COMPUTED_SQL):
+        expected = tuple(r)[1:]
+        if stored.pop(r["exam_id"], None) != expected:
+            drift.append((r["exam_id"], expected))
+    drift.extend((exam_id, None) for exam_id in stored)
+    return drift
+
+
+# ---------- incremental maintenance ----------
+def exam_created(con, exam_id, enrolled):
+    con.execute(
+        "INSERT OR REPLACE INTO exam_stats (exam_id, enrolled, submitted, present, marks_total) "
+        "VALUES (?, ?, 0, 0, 0)",
+        (exam_id, enrolled)
+    )
+
+
+def exam_deleted(con, exam_id):
+    con.execute("DELETE FROM exam_stats WHERE exam_id=?", (exam_id,))
+
+
+ENROLLED_SQL = """
+    UPDATE exam_stats SET enrolled = enrolled + ?
+    WHERE exam_id IN (
+        SELECT id FROM exams WHERE year=? AND branch=? AND section=?
+    )
+"""
+
+
+def enrolled_changed(con, year, branch, section, delta):
+    if not delta:
+        return
+    con.execute(ENROLLED_SQL, (delta, year, branch, section))
+
+
+def submissions_added(con, records):
+    totals = {}
+    for r in records:
+        t = totals.setdefault(r["exam_id"], [0, 0])
+        t[0] += 1
+        t[1] += r["marks"] or 0
+    con.executemany("""
+        UPDATE exam_stats
+        SET submitted = submitted + ?, present = present + ?, marks_total = marks_total + ?
+        WHERE exam_id=?
+    """, ((n, n, marks, exam_id) for exam_id, (n, marks) in totals.items()))
+
+
+def marks_changed(con, exam_id):
+    con.execute("""
+        UPDATE exam_stats
+        SET marks_total = (SELECT COALESCE(SUM(marks), 0) FROM results WHERE exam_id=?)
+        WHERE exam_id=?
+    """, (exam_id, exam_id))
+
+
+# =========================
+# CLI
+# =========================
+#   python stats.py check   [database.db]  → list exams whose stats drifted
+#   python stats.py rebuild [database.db]  → recompute every row
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("check", "rebuild"):
+        print("usage: python stats.py check|rebuild [database.db]")
+        sys.exit(1)
+
+    con = sqlite3.connect(sys.argv[2] if len(sys.argv) > 2 else "database.db", timeout=30)
+    con.row_factory = sqlite3.Row
+
+    drift = check(con)
+    for exam_id, expected in drift:
+        print(f"❌ exam {exam_id}: expected {expected}")
+
+    if sys.argv[1] == "rebuild":
+        rebuild(con)
+        con.commit()
+        print(f"✅ exam_stats rebuilt ({len(drift)} rows were out of date)")
+    elif drift:
+        sys.exit(1)
+    else:
+        print("✅ exam_stats consistent")
+    con.close()
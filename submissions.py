@@ -0,0 +1,308 @@
+import glob, json, logging, os, threading, time
+
+log = logging.getLogger(__name__)
+
+
+# =========================
+# SUBMISSION WRITES
+# =========================
+# One record per submitted exam:
+#   {"exam_id", "roll", "marks", "answers" (hex), "late", "submit_time",
+#    "attended_on"}
+# Records whose result already exists are dropped first, so replaying a
+# record twice is harmless and only fresh submissions reach the hooks.
+# Runs under the write lock (BEGIN IMMEDIATE in _commit): another
+# process's queue flushing the same (exam_id, roll) waits for this
+# transaction, then finds the result and drops its copy.
+def _fresh(con, records):
+    by_exam = {}
+    for r in records:
+        by_exam.setdefault(r["exam_id"], []).append(r)
+
+    fresh = []
+    for exam_id, recs in by_exam.items():
+        rolls = list({r["roll"] for r in recs})
+        done = set()
+        for i in range(0, len(rolls), 500):
+            part = rolls[i:i + 500]
+            marks = ",".join("?" * len(part))
+            done.update(x[0] for x in con.execute(
+                f"SELECT roll FROM results WHERE exam_id=? AND roll IN ({marks})",
+                [exam_id] + part
+            ))
+        for r in recs:
+            if r["roll"] not in done:
+                done.add(r["roll"])
+                fresh.append(r)
+    return fresh
+
+
+def write_batch(con, records):
+    records = _fresh(con, records)
+    con.executemany(
+        "INSERT OR IGNORE INTO results "
+        "(roll, exam_id, marks, submit_time, late) VALUES (?,?,?,?,?)",
+        ((r["roll"], r["exam_id"], r["marks"], r["submit_time"], r["late"]) for r in records)
+    )
+    con.executemany(
+        "INSERT OR IGNORE INTO responses (exam_id, roll, answers) VALUES (?,?,?)",
+        ((r["exam_id"], r["roll"], bytes.fromhex(r["answers"])) for r in records)
+    )
+    con.executemany(
+        "INSERT OR IGNORE INTO attendance "
+        "(exam_id, roll, status, attended_on) VALUES (?,?,'PRESENT',?)",
+        ((r["exam_id"], r["roll"], r["attended_on"]) for r in records)
+    )
+    return records
+
+
+# =========================
+# WRITE-BEHIND QUEUE
+# =========================
+# submit() appends the record to a per-process log and fsyncs it before
+# returning, so an acknowledged submission survives a crash. Appenders
+# waiting at the same time share one fsync: whoever gets the sync lock
+# first syncs everything written so far, the rest find their record
+# already covered. A background thread group-commits everything queued
+# every `interval` seconds in one transaction, then discards the log
+# segment it covered. Segments left behind by a dead process are
+# replayed on start. flush() holds the commit lock from taking a batch
+# until it is committed, so a flush() returns only once everything
+# submitted before it is in the database.
+class SubmissionQueue:
+
+    def __init__(self, pool, log_dir="submission_log", interval=0.005,
+                 max_batch=1000, durable=True):
+        self.pool = pool
+        self.log_dir = log_dir
+        self.interval = interval
+        self.max_batch = max_batch
+        self.durable = durable
+        self.on_write = []            # fn(con, records) inside the write transaction
+        self.on_commit = []           # fn(con, records) after each commit
+
+        self._pid = os.getpid()
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._written = 0             # records appended to the log
+        self._synced = 0              # … of which known to be on disk
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._pending = []
+        self._keys = set()            # (exam_id, roll) not yet committed
+        self._sealed = []             # log segments covering _pending
+        self._fh = None
+        self._thread = None
+        self.stats = {"submitted": 0, "batches": 0, "committed": 0, "replayed": 0, "errors": 0}
+
+    # ---------- log files ----------
+    def _current_path(self):
+        return os.path.join(self.log_dir, f"{self._pid}.log")
+
+    def _open_log(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._fh = open(self._current_path(), "a", encoding="utf-8")
+
+    def _seal(self):
+        # Current segment → <pid>.<seq>.sealed, then start a fresh one;
+        # synced first, appenders still waiting for their fsync may be in it
+        if self.durable:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+        self._fh.close()
+        self._seq += 1
+        sealed = os.path.join(self.log_dir, f"{self._pid}.{self._seq}.sealed")
+        os.replace(self._current_path(), sealed)
+        self._open_log()
+        return sealed
+
+    @staticmethod
+    def _read(path):
+        records = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # torn final line from a crash mid-append
+                    break
+        return records
+
+    @staticmethod
+    def _alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    # ---------- lifecycle ----------
+    def start(self):
+        if self._thread is not None:
+            return
+        self.replay()
+        self._open_log()
+        self._thread = threading.Thread(target=self._run, name="submission-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self.flush()
+        if self._fh is not None:
+            self._fh.close()
+            if os.path.exists(self._current_path()) and not self._pending:
+                os.remove(self._current_path())
+            self._fh = None
+
+    def running(self):
+        return self._thread is not None
+
+    def replay(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        orphaned = []
+        for path in sorted(glob.glob(os.path.join(self.log_dir, "*"))):
+            try:
+                pid = int(os.path.basename(path).split(".")[0])
+            except ValueError:
+                continue
+            if pid == self._pid or not self._alive(pid):
+                orphaned.append(path)
+
+        records = []
+        for path in orphaned:
+            records.extend(self._read(path))
+        if records:
+            self._commit(records)
+            self.stats["replayed"] += len(records)
+        for path in orphaned:
+            os.remove(path)
+        return len(records)
+
+    # ---------- producer ----------
+    def submit(self, record):
+        key = (record["exam_id"], record["roll"])
+
+        # Not running (scripts, SUBMIT_QUEUE=0) → write through
+        if self._thread is None:
+            self._commit([record])
+            return True
+
+        with self._lock:
+            if key in self._keys:
+                return False
+            self._fh.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self._fh.flush()
+            self._written += 1
+            seq = self._written
+            self._pending.append(record)
+            self._keys.add(key)
+            self.stats["submitted"] += 1
+        if self.durable:
+            self._sync(seq)
+        self._wake.set()
+        return True
+
+    def _sync(self, seq):
+        # Group fsync: one leader syncs for every record written so far
+        with self._sync_lock:
+            if self._synced >= seq:
+                return
+            with self._lock:
+                target = self._written
+                # dup → stays valid if flush() seals this segment meanwhile
+                fd = os.dup(self._fh.fileno())
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._synced = max(self._synced, target)
+
+    def add_hook(self, fn=None, *, in_transaction=False):
+        # fn(con, records) runs with the fresh records after each commit, or
+        # before it (same transaction, a failure rolls the batch back) when
+        # in_transaction=True
+        if fn is None:
+            return lambda f: self.add_hook(f, in_transaction=in_transaction)
+        (self.on_write if in_transaction else self.on_commit).append(fn)
+        return fn
+
+    def is_pending(self, exam_id, roll):
+        return (exam_id, roll) in self._keys
+
+    # ---------- consumer ----------
+    def _commit(self, records):
+        con = self.pool.connection()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            fresh = write_batch(con, records)
+            for fn in self.on_write:
+                fn(con, fresh)
+            con.commit()
+            for fn in self.on_commit:
+                try:
+                    fn(con, fresh)
+                except Exception:
+                    log.exception("submission commit hook %s failed", fn.__name__)
+                    con.rollback()
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            con.close()
+
+    def flush(self):
+        with self._commit_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+            if self._fh is not None:
+                self._sealed.append(self._seal())
+            sealed, self._sealed = self._sealed, []
+
+        try:
+            for i in range(0, len(batch), self.max_batch):
+                self._commit(batch[i:i + self.max_batch])
+        except Exception:
+            # Put everything back; the sealed segments stay on disk
+            with self._lock:
+                self._pending = batch + self._pending
+                self._sealed = sealed + self._sealed
+            self.stats["errors"] += 1
+            raise
+
+        with self._lock:
+            for r in batch:
+                self._keys.discard((r["exam_id"], r["roll"]))
+            self.stats["batches"] += 1
+            self.stats["committed"] += len(batch)
+        for path in sealed:
+            os.remove(path)
+        return len(batch)
+
+    def _run(self):
+        backoff = self.interval
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            # Let concurrent submitters pile into the same batch
+            time.sleep(backoff)
+            try:
+                self.flush()
+                backoff = self.interval
+            except Exception:
+                log.exception("submission batch commit failed")
+                backoff = min(backoff * 2 or 0.01, 1.0)
+                self._wake.set()